@@ -3,18 +3,43 @@ Main Flask application for the AI-powered training module.
 Handles API endpoints for conversation simulation and evaluation.
 """
 
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, url_for, Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import os
+import secrets
+import threading
 
 from modules.conversation_simulator import ConversationSimulator
 from modules.nlp_scorer import NLPScorer
 from modules.feedback_generator import FeedbackGenerator
+from modules.session_store import create_session_store
+
+try:
+    import orjson
+    _orjson_available = True
+except ImportError:
+    _orjson_available = False
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider that uses orjson for faster (de)serialization."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 
 app = Flask(__name__, 
             template_folder='../frontend',
             static_folder='../static')
 CORS(app)
+if _orjson_available:
+    app.json = OrjsonProvider(app)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -25,6 +50,52 @@ conversation_sim = ConversationSimulator()
 nlp_scorer = NLPScorer()
 feedback_gen = FeedbackGenerator()
 
+# Warm up the LLM connection in the background so the first student message
+# does not pay for connection setup
+threading.Thread(target=conversation_sim.warm_up, daemon=True).start()
+
+# Background pool for message processing, so the async endpoint can return
+# immediately while scoring and the (possibly slow) LLM call run elsewhere.
+# Task status lives in the session store (Redis when configured), so any
+# worker can answer a status poll, and unclaimed results expire.
+message_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('MESSAGE_WORKERS', '16'))
+)
+task_store = create_session_store()
+
+
+def _process_message(session_id, student_message):
+    """Score a student message, get the patient response and build feedback."""
+    # Score the student's message
+    scores = nlp_scorer.score_message(student_message, session_id)
+
+    # Get patient response based on student message
+    patient_response = conversation_sim.get_response(session_id, student_message, scores)
+
+    # Generate feedback
+    feedback = feedback_gen.generate_feedback(student_message, scores)
+
+    return {
+        'patient_message': patient_response,
+        'scores': scores.as_dict(),
+        'feedback': feedback
+    }
+
+
+def _run_message_task(task_id, session_id, student_message):
+    """Process a queued message and store its result for the status endpoint."""
+    try:
+        task = {'status': 'done', 'result': _process_message(session_id, student_message)}
+    except Exception as e:
+        logger.error(f"Error processing message: {str(e)}")
+        task = {'status': 'error'}
+    # Free the session before publishing, so a client that sees the result can
+    # queue its next message straight away
+    try:
+        task_store.finish_session_task(session_id)
+    finally:
+        task_store.set_task(task_id, task)
+
 
 @app.route('/')
 def index():
@@ -71,24 +142,127 @@ def send_message():
                 'error': 'Missing session_id or message'
             }), 400
         
-        # Score the student's message
+        result = _process_message(session_id, student_message)
+        
+        return jsonify({'success': True, **result})
+    except Exception as e:
+        logger.error(f"Error processing message: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to process message'}), 500
+
+
+@app.route('/api/send-message-stream', methods=['POST'])
+def send_message_stream():
+    """
+    Process student's message and stream the patient response as server-sent events.
+    Each event carries a text `delta`; the final event has `done` set and
+    includes the full patient message, scores and feedback.
+    """
+    try:
+        data = request.json
+        session_id = data.get('session_id')
+        student_message = data.get('message')
+        
+        if not session_id or not student_message:
+            return jsonify({
+                'success': False, 
+                'error': 'Missing session_id or message'
+            }), 400
+        
         scores = nlp_scorer.score_message(student_message, session_id)
+        chunks = conversation_sim.stream_response(session_id, student_message, scores)
+    except Exception as e:
+        logger.error(f"Error processing message: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to process message'}), 500
+    
+    def _event(payload):
+        return f"data: {app.json.dumps(payload)}\n\n"
+    
+    def generate():
+        try:
+            parts = []
+            for chunk in chunks:
+                parts.append(chunk)
+                yield _event({'delta': chunk})
+            
+            feedback = feedback_gen.generate_feedback(student_message, scores)
+            yield _event({
+                'success': True,
+                'done': True,
+                'patient_message': ''.join(parts).strip(),
+                'scores': scores.as_dict(),
+                'feedback': feedback
+            })
+        except Exception as e:
+            logger.error(f"Error streaming message: {str(e)}")
+            yield _event({'success': False, 'done': True, 'error': 'Failed to process message'})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/api/send-message-async', methods=['POST'])
+def send_message_async():
+    """
+    Queue a student's message for processing and return immediately.
+    Poll the returned status URL for the patient response and evaluation.
+    """
+    try:
+        data = request.json
+        session_id = data.get('session_id')
+        student_message = data.get('message')
         
-        # Get patient response based on student message
-        patient_response = conversation_sim.get_response(session_id, student_message, scores)
+        if not session_id or not student_message:
+            return jsonify({
+                'success': False, 
+                'error': 'Missing session_id or message'
+            }), 400
         
-        # Generate feedback
-        feedback = feedback_gen.generate_feedback(student_message, scores)
+        task_id = secrets.token_urlsafe(16)
+        # Turns of a session read and write its counters, so they must not overlap
+        if not task_store.start_session_task(session_id, task_id):
+            return jsonify({
+                'success': False,
+                'error': 'A message for this session is already being processed'
+            }), 409
+        task_store.set_task(task_id, {'status': 'pending'})
+        message_executor.submit(_run_message_task, task_id, session_id, student_message)
         
         return jsonify({
             'success': True,
-            'patient_message': patient_response,
-            'scores': scores,
-            'feedback': feedback
-        })
+            'task_id': task_id,
+            'status_url': url_for('message_status', task_id=task_id)
+        }), 202
     except Exception as e:
-        logger.error(f"Error processing message: {str(e)}")
-        return jsonify({'success': False, 'error': 'Failed to process message'}), 500
+        logger.error(f"Error queueing message: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to queue message'}), 500
+
+
+@app.route('/api/message-status/<task_id>', methods=['GET'])
+def message_status(task_id):
+    """
+    Return the result of a queued message, or its pending status.
+    """
+    try:
+        task = task_store.get_task(task_id)
+        if task is None:
+            return jsonify({'success': False, 'error': 'Unknown task_id'}), 404
+        
+        if task['status'] == 'pending':
+            return jsonify({'success': True, 'status': 'pending'}), 202
+        
+        # Results are handed out once; drop the finished task
+        task_store.delete_task(task_id)
+        if task['status'] == 'error':
+            return jsonify({'success': False, 'error': 'Failed to process message'}), 500
+        
+        result = task['result']
+        return jsonify({'success': True, 'status': 'done', **result})
+    except Exception as e:
+        logger.error(f"Error getting message status: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to get message status'}), 500
 
 
 @app.route('/api/end-session', methods=['POST'])
@@ -119,12 +293,19 @@ def end_session():
 def transcribe_speech():
     """
     Transcribe speech audio to text.
+    Accepts a raw audio request body or a multipart upload with an 'audio' file.
     """
     try:
-        if 'audio' not in request.files:
-            return jsonify({'success': False, 'error': 'No audio file'}), 400
+        if request.mimetype == 'multipart/form-data':
+            if 'audio' not in request.files:
+                return jsonify({'success': False, 'error': 'No audio file'}), 400
+            stream = request.files['audio'].stream
+        else:
+            stream = request.stream
         
-        audio_file = request.files['audio']
+        # Nothing consumes the audio yet, so only check that some was sent
+        if not stream.read(1):
+            return jsonify({'success': False, 'error': 'No audio data'}), 400
         
         # For now, return a placeholder - in production, integrate with speech-to-text service
         # Could use Google Speech-to-Text, Azure Speech Service, or open-source alternatives
@@ -140,6 +321,5 @@ def transcribe_speech():
 
 
 if __name__ == '__main__':
-    import os
     debug_mode = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
     app.run(debug=debug_mode, host='0.0.0.0', port=5000)
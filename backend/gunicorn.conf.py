@@ -0,0 +1,21 @@
+"""
+Gunicorn configuration for serving the Flask application.
+
+gevent workers let many in-flight LLM requests overlap on network I/O
+instead of blocking a whole worker per request. Gunicorn's gevent worker
+monkey-patches the standard library before the app is imported.
+
+Usage (from the backend directory):
+    gunicorn app:app
+"""
+
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+worker_class = 'gevent'
+
+# Without REDIS_URL sessions are held in process memory, so requests for one
+# session must reach the same worker. Keep a single worker by default and raise
+# GUNICORN_WORKERS once sessions are stored in Redis.
+workers = int(os.environ.get('GUNICORN_WORKERS', '1'))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', '200'))
@@ -6,10 +6,19 @@ otherwise a rule-based fallback is used.
 """
 
 import os
-import uuid
+import re
+import importlib.util
+import json
+import hashlib
+import secrets
+import time
 from datetime import datetime
 import random
 import logging
+import threading
+from bisect import bisect_left
+
+from .session_store import create_session_store
 
 try:
     from openai import OpenAI
@@ -17,8 +26,98 @@ try:
 except ImportError:
     _openai_available = False
 
+try:
+    import httpx
+    _httpx_available = True
+except ImportError:
+    _httpx_available = False
+
 logger = logging.getLogger(__name__)
 
+# One connection pool per process, shared by every LLM client, so TLS
+# connections to the API are reused across simulators and requests.
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def _get_http_client():
+    """Return the process-wide HTTP client used for LLM requests."""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = httpx.Client(
+                http2=importlib.util.find_spec('h2') is not None,
+                limits=httpx.Limits(max_keepalive_connections=64, max_connections=256),
+                follow_redirects=True,
+            )
+    return _http_client
+
+# Topics the rule-based patient reacts to, checked in priority order
+_SIDE_EFFECT_RE = re.compile(r'side effect|reaction', re.IGNORECASE)
+_SAFETY_RE = re.compile(r'safe|tested', re.IGNORECASE)
+
+# Rule-based patient responses, grouped by openness level and topic
+_HIGH_OPENNESS = (
+    "You know, that actually makes sense. I hadn't thought about it that way before.",
+    "I appreciate you taking the time to explain this. I'm starting to feel better about it.",
+    "Thank you for addressing my concerns. I think I understand better now.",
+    "That's reassuring to hear. Maybe I was worrying too much."
+)
+# After a few turns a convinced patient may also agree to be vaccinated
+_HIGH_OPENNESS_LATE = _HIGH_OPENNESS + (
+    "Okay, I think you've convinced me. What are the next steps to get vaccinated?",
+    "I feel much better about this now. Thank you for being so patient with me."
+)
+_MID_OPENNESS_SIDE_EFFECTS = (
+    "I see. But what about the people who have had severe reactions?",
+    "That helps, but I'm still worried about potential side effects.",
+    "How common are these side effects you mentioned?"
+)
+_MID_OPENNESS_SAFETY = (
+    "I understand they did testing, but was it really enough time?",
+    "That's somewhat reassuring, but I still have some doubts.",
+    "Can you tell me more about the testing process?"
+)
+_MID_OPENNESS = (
+    "I'm listening, but I'm not entirely convinced yet.",
+    "That's interesting. Can you explain more?",
+    "I appreciate the information, but I still have questions."
+)
+_LOW_OPENNESS_LOW_EMPATHY = (
+    "You're not really listening to my concerns.",
+    "I don't think you understand how I feel about this.",
+    "This doesn't feel like you care about my worries."
+)
+_LOW_OPENNESS = (
+    "I've heard that before, but I'm still not sure I believe it.",
+    "But what about all the stories I've heard?",
+    "I don't know... I'm still very skeptical.",
+    "That's what they say, but how can I be sure?"
+)
+
+# How the LLM persona describes its openness, by band
+_PROMPT_LEVELS = {
+    'low': "very resistant",
+    'mid': "somewhat open",
+    'high': "fairly open"
+}
+
+# Pleasantries with nothing for the LLM to respond to
+_TRIVIAL_MESSAGES = frozenset({
+    'hi', 'hello', 'hey', 'ok', 'okay', 'sure', 'yes', 'no', 'thanks',
+    'thank you', 'thank you very much', 'got it', 'i see', 'okay thanks'
+})
+
+# Openness band edges: up to 0.4 is low, up to 0.7 is medium, above is high
+_OPENNESS_BANDS = (0.4, 0.7)
+_LOW_BAND, _MID_BAND, _HIGH_BAND = range(3)
+
+# Medium-openness topics in priority order; the first matching pattern wins
+_MID_OPENNESS_TOPICS = (
+    (_SIDE_EFFECT_RE, _MID_OPENNESS_SIDE_EFFECTS),
+    (_SAFETY_RE, _MID_OPENNESS_SAFETY),
+)
+
 
 class ConversationSimulator:
     """Simulates conversations with vaccine-hesitant patients."""
@@ -27,9 +126,13 @@ class ConversationSimulator:
     _LLM_CONTEXT_TURNS = 4
 
     def __init__(self):
-        self.sessions = {}
+        self.sessions = create_session_store(context_size=self._LLM_CONTEXT_TURNS * 2)
         self.personas = self._initialize_personas()
         self._llm_client = self._init_llm_client()
+        # Caps in-flight LLM requests across all sessions to respect rate limits
+        self._llm_slots = threading.BoundedSemaphore(
+            int(os.environ.get('OPENAI_MAX_CONCURRENCY', '64'))
+        )
 
     def _init_llm_client(self):
         """Initialize the OpenAI-compatible LLM client if credentials are available."""
@@ -40,11 +143,30 @@ class ConversationSimulator:
         kwargs = {'api_key': api_key}
         if base_url:
             kwargs['base_url'] = base_url
+        if _httpx_available:
+            kwargs['http_client'] = _get_http_client()
         return OpenAI(**kwargs)
+
+    def warm_up(self):
+        """
+        Send a one-token LLM request so the connection pool (and any server-side
+        model cache) is ready before the first student message. Does nothing
+        when no LLM is configured; failures are only logged.
+        """
+        if self._llm_client is None:
+            return
+        try:
+            self._llm_client.chat.completions.create(
+                model=os.environ.get('OPENAI_MODEL', 'gpt-4o-mini'),
+                messages=[{'role': 'user', 'content': 'hi'}],
+                max_tokens=1,
+            )
+        except Exception as exc:
+            logger.warning("LLM warm-up request failed: %s", exc)
     
     def _initialize_personas(self):
         """Define different patient personas with varying concerns."""
-        return {
+        personas = {
             'default': {
                 'name': 'Alex',
                 'concerns': ['side_effects', 'safety'],
@@ -81,6 +203,14 @@ class ConversationSimulator:
                 'personality': 'distrustful'
             }
         }
+        
+        # Pre-render the LLM system prompt for each openness band
+        for persona in personas.values():
+            persona['_prompts'] = {
+                band: self._render_llm_system_prompt(persona, level)
+                for band, level in _PROMPT_LEVELS.items()
+            }
+        return personas
     
     def start_session(self, persona_key='default'):
         """
@@ -92,27 +222,38 @@ class ConversationSimulator:
         Returns:
             tuple: (session_id, initial_message)
         """
-        session_id = str(uuid.uuid4())
-        persona = self.personas.get(persona_key, self.personas['default'])
+        session_id = secrets.token_urlsafe(16)
+        if persona_key not in self.personas:
+            persona_key = 'default'
+        persona = self.personas[persona_key]
         
-        self.sessions[session_id] = {
-            'persona': persona,
-            'conversation_history': [],
-            'scores_history': [],
-            'start_time': datetime.now(),
+        self.sessions.create(session_id, {
+            'persona_key': persona_key,
+            'start_ns': time.time_ns(),
             'openness_level': persona['openness'],
-            'turn_count': 0
-        }
+            'turn_count': 0,
+            # Running totals for the average scores in the summary
+            'score_totals': {'empathy': 0, 'accuracy': 0, 'clarity': 0}
+        })
         
         initial_message = persona['initial_message']
-        self.sessions[session_id]['conversation_history'].append({
+        self.sessions.append_history(session_id, {
             'speaker': 'patient',
             'message': initial_message,
-            'timestamp': datetime.now().isoformat()
+            'ts_ns': time.time_ns()
         })
         
         return session_id, initial_message
     
+    def _load_session(self, session_id):
+        """Fetch a session's state with its persona attached."""
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise ValueError("Invalid session ID")
+        session['session_id'] = session_id
+        session['persona'] = self.personas.get(session['persona_key'], self.personas['default'])
+        return session
+    
     def get_response(self, session_id, student_message, scores):
         """
         Generate patient response based on student's message and scores.
@@ -125,25 +266,56 @@ class ConversationSimulator:
         Returns:
             str: Patient's response
         """
-        if session_id not in self.sessions:
-            raise ValueError("Invalid session ID")
+        session = self._begin_turn(session_id, student_message, scores)
         
-        session = self.sessions[session_id]
-        session['turn_count'] += 1
+        # Generate response based on openness level
+        response = self._generate_contextual_response(session, student_message, scores)
         
-        # Record student message
-        session['conversation_history'].append({
-            'speaker': 'student',
-            'message': student_message,
-            'timestamp': datetime.now().isoformat()
-        })
+        self._record_turn(session, student_message, response)
+        return response
+    
+    def stream_response(self, session_id, student_message, scores):
+        """
+        Generate patient response as a stream of text chunks.
+        
+        The session is updated immediately (so an invalid session ID raises
+        here); the turn is recorded once the stream is exhausted.
+        
+        Args:
+            session_id: ID of the current session
+            student_message: The student's message
+            scores: NLP scores for the student's message
+            
+        Returns:
+            iterator: Chunks of the patient's response
+        """
+        session = self._begin_turn(session_id, student_message, scores)
+        
+        def generate():
+            parts = []
+            for chunk in self._stream_contextual_response(session, student_message, scores):
+                parts.append(chunk)
+                yield chunk
+            self._record_turn(session, student_message, ''.join(parts).strip())
+        
+        return generate()
+    
+    def _begin_turn(self, session_id, student_message, scores):
+        """Record the student's scores and update openness."""
+        session = self._load_session(session_id)
+        session['turn_count'] += 1
+        session['turn_started_ns'] = time.time_ns()
         
-        # Record scores
-        session['scores_history'].append(scores)
+        # Record scores on a copy: get() is shallow, so the stored dict must
+        # not change before update() writes the totals back
+        totals = session['score_totals'] = dict(session['score_totals'])
+        totals['empathy'] += scores.empathy
+        totals['accuracy'] += scores.accuracy
+        totals['clarity'] += scores.clarity
         
         # Adjust openness based on empathy and accuracy scores
-        empathy_score = scores.get('empathy', 0.5)
-        accuracy_score = scores.get('accuracy', 0.5)
+        empathy_score = scores.empathy
+        accuracy_score = scores.accuracy
         
         # Patient becomes more open if student shows high empathy and accuracy
         if empathy_score > 0.7 and accuracy_score > 0.6:
@@ -151,30 +323,66 @@ class ConversationSimulator:
         elif empathy_score < 0.4:
             session['openness_level'] = max(0.0, session['openness_level'] - 0.1)
         
-        # Generate response based on openness level
-        response = self._generate_contextual_response(session, student_message, scores)
-        
-        # Record patient response
-        session['conversation_history'].append({
-            'speaker': 'patient',
-            'message': response,
-            'timestamp': datetime.now().isoformat()
-        })
-        
-        return response
+        self.sessions.update(
+            session_id,
+            turn_count=session['turn_count'],
+            openness_level=session['openness_level'],
+            score_totals=totals
+        )
+        return session
     
+    def _record_turn(self, session, student_message, response):
+        """
+        Record the student's message and the patient's response in one store
+        write (a single pipelined round trip with Redis), so the next turn and
+        the summary always see it, whichever worker serves them.
+        """
+        self.sessions.append_history(
+            session['session_id'],
+            {'speaker': 'student', 'message': student_message, 'ts_ns': session['turn_started_ns']},
+            {'speaker': 'patient', 'message': response, 'ts_ns': time.time_ns()}
+        )
+    
+    @staticmethod
+    def _is_trivial_message(student_message):
+        """Return True for pleasantries or very short non-questions."""
+        normalized = student_message.strip(' .!,').lower()
+        if normalized in _TRIVIAL_MESSAGES:
+            return True
+        return len(normalized.split()) < 3 and '?' not in student_message
+
+    def _use_llm(self, student_message):
+        """Decide whether this message is worth an LLM call."""
+        return self._llm_client is not None and not self._is_trivial_message(student_message)
+
     def _generate_contextual_response(self, session, student_message, scores):
         """Generate a contextual patient response, using LLM when available."""
-        if self._llm_client is not None:
+        if self._use_llm(student_message):
             try:
                 return self._generate_llm_response(session, student_message)
             except Exception as exc:
                 logger.warning("LLM call failed, falling back to rule-based response: %s", exc)
         return self._generate_rule_based_response(session, student_message, scores)
 
-    def _build_llm_system_prompt(self, persona, openness):
-        """Build a minimal system prompt that describes the patient persona."""
-        level = "very resistant" if openness < 0.35 else ("somewhat open" if openness < 0.65 else "fairly open")
+    def _stream_contextual_response(self, session, student_message, scores):
+        """Stream a contextual patient response, using LLM when available."""
+        if self._use_llm(student_message):
+            started = False
+            try:
+                for chunk in self._stream_llm_response(session, student_message):
+                    started = True
+                    yield chunk
+                return
+            except Exception as exc:
+                if started:
+                    logger.warning("LLM stream interrupted: %s", exc)
+                    return
+                logger.warning("LLM call failed, falling back to rule-based response: %s", exc)
+        yield self._generate_rule_based_response(session, student_message, scores)
+
+    @staticmethod
+    def _render_llm_system_prompt(persona, level):
+        """Render a minimal system prompt that describes the patient persona."""
         return (
             f"You are {persona['name']}, a vaccine-hesitant patient. "
             f"Personality: {persona['personality']}. "
@@ -184,28 +392,78 @@ class ConversationSimulator:
             "Do not repeat yourself. Do not give medical advice."
         )
 
-    def _generate_llm_response(self, session, student_message):
-        """Call the LLM to generate a patient response."""
+    def _build_llm_system_prompt(self, persona, openness):
+        """Return the persona's pre-rendered system prompt for this openness."""
+        band = 'low' if openness < 0.35 else ('mid' if openness < 0.65 else 'high')
+        return persona['_prompts'][band]
+
+    def _build_llm_messages(self, session, student_message):
+        """Build the chat messages sent to the LLM for this turn."""
         persona = session['persona']
-        model = os.environ.get('OPENAI_MODEL', 'gpt-4o-mini')
         system_prompt = self._build_llm_system_prompt(persona, session['openness_level'])
 
         # Build a short message history (system + last N turns + new student turn)
         messages = [{'role': 'system', 'content': system_prompt}]
         # Each turn contains one student message and one patient message (2 entries each)
-        recent_turns = session['conversation_history'][-(self._LLM_CONTEXT_TURNS * 2):]
+        recent_turns = self.sessions.recent_history(session['session_id'], self._LLM_CONTEXT_TURNS * 2)
         for turn in recent_turns:
             role = 'assistant' if turn['speaker'] == 'patient' else 'user'
             messages.append({'role': role, 'content': turn['message']})
         messages.append({'role': 'user', 'content': student_message})
+        return messages
 
-        response = self._llm_client.chat.completions.create(
-            model=model,
-            messages=messages,
-            max_tokens=100,
-            temperature=0.7,
-        )
-        return response.choices[0].message.content.strip()
+    @staticmethod
+    def _llm_cache_key(model, messages):
+        """Hash the model and full prompt into a response cache key."""
+        payload = json.dumps([model, messages], sort_keys=True).encode()
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+    def _generate_llm_response(self, session, student_message):
+        """Call the LLM to generate a patient response."""
+        model = os.environ.get('OPENAI_MODEL', 'gpt-4o-mini')
+        messages = self._build_llm_messages(session, student_message)
+        cache_key = self._llm_cache_key(model, messages)
+        cached = self.sessions.get_cached_response(cache_key)
+        if cached is not None:
+            return cached
+
+        with self._llm_slots:
+            response = self._llm_client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=100,
+                temperature=0.7,
+            )
+        text = response.choices[0].message.content.strip()
+        self.sessions.cache_response(cache_key, text)
+        return text
+
+    def _stream_llm_response(self, session, student_message):
+        """Call the LLM and yield the patient response as it is generated."""
+        model = os.environ.get('OPENAI_MODEL', 'gpt-4o-mini')
+        messages = self._build_llm_messages(session, student_message)
+        cache_key = self._llm_cache_key(model, messages)
+        cached = self.sessions.get_cached_response(cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+        parts = []
+        with self._llm_slots:
+            response = self._llm_client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=100,
+                temperature=0.7,
+                stream=True,
+            )
+            for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield parts[-1]
+        text = ''.join(parts).strip()
+        if text:
+            self.sessions.cache_response(cache_key, text)
 
     def _generate_rule_based_response(self, session, student_message, scores):
         """Generate a contextual patient response."""
@@ -213,59 +471,25 @@ class ConversationSimulator:
         openness = session['openness_level']
         turn_count = session['turn_count']
         
-        # Analyze student message for key topics
-        message_lower = student_message.lower()
+        band = bisect_left(_OPENNESS_BANDS, openness)
         
         # High openness responses (patient is being convinced)
-        if openness > 0.7:
-            responses = [
-                "You know, that actually makes sense. I hadn't thought about it that way before.",
-                "I appreciate you taking the time to explain this. I'm starting to feel better about it.",
-                "Thank you for addressing my concerns. I think I understand better now.",
-                "That's reassuring to hear. Maybe I was worrying too much."
-            ]
-            if turn_count > 3:
-                responses.extend([
-                    "Okay, I think you've convinced me. What are the next steps to get vaccinated?",
-                    "I feel much better about this now. Thank you for being so patient with me."
-                ])
+        if band == _HIGH_BAND:
+            responses = _HIGH_OPENNESS_LATE if turn_count > 3 else _HIGH_OPENNESS
         
         # Medium openness (patient is listening but still has concerns)
-        elif openness > 0.4:
-            if 'side effect' in message_lower or 'reaction' in message_lower:
-                responses = [
-                    "I see. But what about the people who have had severe reactions?",
-                    "That helps, but I'm still worried about potential side effects.",
-                    "How common are these side effects you mentioned?"
-                ]
-            elif 'safe' in message_lower or 'tested' in message_lower:
-                responses = [
-                    "I understand they did testing, but was it really enough time?",
-                    "That's somewhat reassuring, but I still have some doubts.",
-                    "Can you tell me more about the testing process?"
-                ]
-            else:
-                responses = [
-                    "I'm listening, but I'm not entirely convinced yet.",
-                    "That's interesting. Can you explain more?",
-                    "I appreciate the information, but I still have questions."
-                ]
+        elif band == _MID_BAND:
+            responses = next(
+                (topic_responses for pattern, topic_responses in _MID_OPENNESS_TOPICS
+                 if pattern.search(student_message)),
+                _MID_OPENNESS
+            )
         
         # Low openness (patient is resistant)
+        elif scores.empathy < 0.4:
+            responses = _LOW_OPENNESS_LOW_EMPATHY
         else:
-            if scores.get('empathy', 0.5) < 0.4:
-                responses = [
-                    "You're not really listening to my concerns.",
-                    "I don't think you understand how I feel about this.",
-                    "This doesn't feel like you care about my worries."
-                ]
-            else:
-                responses = [
-                    "I've heard that before, but I'm still not sure I believe it.",
-                    "But what about all the stories I've heard?",
-                    "I don't know... I'm still very skeptical.",
-                    "That's what they say, but how can I be sure?"
-                ]
+            responses = _LOW_OPENNESS
         
         return random.choice(responses)
     
@@ -279,36 +503,32 @@ class ConversationSimulator:
         Returns:
             dict: Session summary with statistics
         """
-        if session_id not in self.sessions:
-            raise ValueError("Invalid session ID")
+        session = self._load_session(session_id)
         
-        session = self.sessions[session_id]
-        
-        # Calculate average scores
+        # Calculate average scores (one set of scores is recorded per turn)
+        turn_count = session['turn_count']
         avg_scores = {
-            'empathy': 0,
-            'accuracy': 0,
-            'clarity': 0
+            key: total / turn_count if turn_count else 0
+            for key, total in session['score_totals'].items()
         }
         
-        if session['scores_history']:
-            for score_set in session['scores_history']:
-                for key in avg_scores.keys():
-                    avg_scores[key] += score_set.get(key, 0)
-            
-            for key in avg_scores.keys():
-                avg_scores[key] /= len(session['scores_history'])
-        
         summary = {
-            'duration_minutes': (datetime.now() - session['start_time']).seconds / 60,
+            'duration_minutes': (time.time_ns() - session['start_ns']) / 6e10,
             'turn_count': session['turn_count'],
             'final_openness': session['openness_level'],
             'average_scores': avg_scores,
             'persona_name': session['persona']['name'],
-            'conversation_history': session['conversation_history']
+            'conversation_history': [
+                {
+                    'speaker': turn['speaker'],
+                    'message': turn['message'],
+                    'timestamp': datetime.fromtimestamp(turn['ts_ns'] / 1e9).isoformat()
+                }
+                for turn in self.sessions.history(session_id)
+            ]
         }
         
         # Clean up session
-        del self.sessions[session_id]
+        self.sessions.delete(session_id)
         
         return summary
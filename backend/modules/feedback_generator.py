@@ -3,12 +3,97 @@ Feedback Generator Module
 Generates detailed, actionable feedback based on NLP scores.
 """
 
+from bisect import bisect_right
+from functools import lru_cache
+
+from .nlp_scorer import _count_keywords
+
+# Score thresholds; bisect_right(thresholds, score) indexes the tables below
+_LEVEL_THRESHOLDS = (0.5, 0.65, 0.8)
+_FEEDBACK_THRESHOLDS = (0.4, 0.6, 0.75)
+
+_LEVELS = ("Needs Improvement", "Fair", "Good", "Excellent")
+
+_OVERALL_MESSAGES = (
+    "This response needs improvement. Focus on being more empathetic and providing accurate, clear information.",
+    "Fair response. Consider focusing on building rapport and providing clearer information.",
+    "Good response. You're on the right track, but there's room for improvement in some areas.",
+    "Excellent response! You demonstrated strong empathy, provided accurate information, and communicated clearly."
+)
+
+_EMPATHY_MESSAGES = (
+    "Try to be more empathetic. Start by validating the patient's feelings with phrases like 'I understand your concern' or 'That's a valid worry.'",
+    "Your empathy could be stronger. Remember to acknowledge the patient's concerns before providing information.",
+    "You showed good empathy. To improve, try using more phrases that validate the patient's feelings.",
+    "You demonstrated excellent empathy by acknowledging the patient's concerns and showing understanding."
+)
+
+_ACCURACY_MESSAGES = (
+    "Your response needs more accurate information. Avoid speculation and focus on evidence-based facts about vaccine safety and efficacy.",
+    "Include more factual information. Reference clinical trials, FDA approval, or specific statistics.",
+    "Good accuracy. Consider adding specific data or studies to strengthen your response.",
+    "You provided accurate, evidence-based information. Well done!"
+)
+
+# The two lowest clarity bands depend on message length: (short, long)
+_CLARITY_MESSAGES = (
+    ("Your response is too short. Elaborate more to address the patient's concerns thoroughly.",
+     "Your response is unclear or too complex. Use simpler language and break down information into digestible parts."),
+    ("Your response is too brief. Provide more detail to address the patient's concerns.",
+     "Simplify your language. Avoid excessive jargon and keep sentences concise."),
+    "Generally clear. Try to organize your thoughts into 2-3 concise sentences.",
+    "Your message was clear and well-structured. Great job!"
+)
+
+# Word counts below which the matching clarity band counts as "short"
+_CLARITY_SHORT_WORDS = (10, 15)
+
+# Suggestions are shared by every response and must be treated as read-only
+_SUGGESTION_EMPATHY = {
+    'category': 'Empathy',
+    'tip': "Start your response by acknowledging the patient's feelings: 'I understand why you might feel that way...'",
+    'example': "I can see why you're concerned about side effects. Many people share that worry, and it's completely valid."
+}
+
+_SUGGESTION_ACCURACY = {
+    'category': 'Accuracy',
+    'tip': "Include specific facts and data to support your points.",
+    'example': "Clinical trials with over 30,000 participants showed that the vaccine is over 90% effective and has a strong safety profile."
+}
+
+_SUGGESTION_CLARITY_EXPAND = {
+    'category': 'Clarity',
+    'tip': "Provide more detailed information while staying focused.",
+    'example': "Expand your response to include specific examples and explanations that address the patient's concern."
+}
+
+_SUGGESTION_CLARITY_FOCUS = {
+    'category': 'Clarity',
+    'tip': "Keep your response concise and focused on 1-2 main points.",
+    'example': "Break complex information into shorter, more digestible sentences."
+}
+
+_SUGGESTION_ENGAGEMENT = {
+    'category': 'Engagement',
+    'tip': "Ask follow-up questions to better understand the patient's concerns.",
+    'example': "What specifically worries you most about the vaccine?"
+}
+
+# Number of distinct (message, scores) combinations each generator remembers
+_FEEDBACK_CACHE_SIZE = 4096
+
 
 class FeedbackGenerator:
     """Generates feedback for student responses."""
     
     def __init__(self):
-        pass
+        # Feedback depends only on the message and its three scores, so
+        # repeated combinations are answered from a per-generator LRU cache
+        self._feedback_cached = lru_cache(maxsize=_FEEDBACK_CACHE_SIZE)(self._build_feedback)
+    
+    def clear_cache(self):
+        """Forget all cached feedback."""
+        self._feedback_cached.cache_clear()
     
     def generate_feedback(self, message, scores):
         """
@@ -16,162 +101,97 @@ class FeedbackGenerator:
         
         Args:
             message: The student's message
-            scores: NLP scores dictionary
+            scores: Scores for the message; unless its acknowledges_perspective
+                is None the message is not rescanned
             
         Returns:
             dict: Detailed feedback with suggestions
         """
-        empathy_score = scores.get('empathy', 0)
-        accuracy_score = scores.get('accuracy', 0)
-        clarity_score = scores.get('clarity', 0)
-        
-        feedback = {
+        feedback = self._feedback_cached(
+            message,
+            scores.empathy,
+            scores.accuracy,
+            scores.clarity,
+            scores.acknowledges_perspective
+        )
+        
+        # The cached entry is shared, so hand out copies of its containers
+        return {key: value.copy() if isinstance(value, (dict, list)) else value
+                for key, value in feedback.items()}
+    
+    def _build_feedback(self, message, empathy_score, accuracy_score, clarity_score,
+                        acknowledges_perspective):
+        """Build the feedback for a message with the given scores."""
+        return {
             'overall': self._get_overall_feedback(empathy_score, accuracy_score, clarity_score),
             'empathy': self._get_empathy_feedback(empathy_score, message),
             'accuracy': self._get_accuracy_feedback(accuracy_score, message),
             'clarity': self._get_clarity_feedback(clarity_score, message),
-            'suggestions': self._get_suggestions(scores, message),
-            'strengths': self._get_strengths(scores, message)
+            'suggestions': self._get_suggestions(empathy_score, accuracy_score, clarity_score, message),
+            'strengths': self._get_strengths(empathy_score, accuracy_score, clarity_score,
+                                             message, acknowledges_perspective)
         }
-        
-        return feedback
     
     def _get_overall_feedback(self, empathy, accuracy, clarity):
         """Generate overall performance feedback."""
         avg_score = (empathy + accuracy + clarity) / 3
-        
-        if avg_score >= 0.8:
-            return "Excellent response! You demonstrated strong empathy, provided accurate information, and communicated clearly."
-        elif avg_score >= 0.65:
-            return "Good response. You're on the right track, but there's room for improvement in some areas."
-        elif avg_score >= 0.5:
-            return "Fair response. Consider focusing on building rapport and providing clearer information."
-        else:
-            return "This response needs improvement. Focus on being more empathetic and providing accurate, clear information."
+        return _OVERALL_MESSAGES[bisect_right(_LEVEL_THRESHOLDS, avg_score)]
     
     def _get_empathy_feedback(self, score, message):
         """Generate empathy-specific feedback."""
-        feedback = {
+        return {
             'score': score,
             'level': self._get_level(score),
-            'message': ''
+            'message': _EMPATHY_MESSAGES[bisect_right(_FEEDBACK_THRESHOLDS, score)]
         }
-        
-        if score >= 0.75:
-            feedback['message'] = "You demonstrated excellent empathy by acknowledging the patient's concerns and showing understanding."
-        elif score >= 0.6:
-            feedback['message'] = "You showed good empathy. To improve, try using more phrases that validate the patient's feelings."
-        elif score >= 0.4:
-            feedback['message'] = "Your empathy could be stronger. Remember to acknowledge the patient's concerns before providing information."
-        else:
-            feedback['message'] = "Try to be more empathetic. Start by validating the patient's feelings with phrases like 'I understand your concern' or 'That's a valid worry.'"
-        
-        return feedback
     
     def _get_accuracy_feedback(self, score, message):
         """Generate accuracy-specific feedback."""
-        feedback = {
+        return {
             'score': score,
             'level': self._get_level(score),
-            'message': ''
+            'message': _ACCURACY_MESSAGES[bisect_right(_FEEDBACK_THRESHOLDS, score)]
         }
-        
-        if score >= 0.75:
-            feedback['message'] = "You provided accurate, evidence-based information. Well done!"
-        elif score >= 0.6:
-            feedback['message'] = "Good accuracy. Consider adding specific data or studies to strengthen your response."
-        elif score >= 0.4:
-            feedback['message'] = "Include more factual information. Reference clinical trials, FDA approval, or specific statistics."
-        else:
-            feedback['message'] = "Your response needs more accurate information. Avoid speculation and focus on evidence-based facts about vaccine safety and efficacy."
-        
-        return feedback
     
     def _get_clarity_feedback(self, score, message):
         """Generate clarity-specific feedback."""
-        feedback = {
+        band = bisect_right(_FEEDBACK_THRESHOLDS, score)
+        text = _CLARITY_MESSAGES[band]
+        if band < len(_CLARITY_SHORT_WORDS):
+            short, long = text
+            text = short if len(message.split()) < _CLARITY_SHORT_WORDS[band] else long
+        
+        return {
             'score': score,
             'level': self._get_level(score),
-            'message': ''
+            'message': text
         }
-        
-        word_count = len(message.split())
-        
-        if score >= 0.75:
-            feedback['message'] = "Your message was clear and well-structured. Great job!"
-        elif score >= 0.6:
-            feedback['message'] = "Generally clear. Try to organize your thoughts into 2-3 concise sentences."
-        elif score >= 0.4:
-            if word_count < 15:
-                feedback['message'] = "Your response is too brief. Provide more detail to address the patient's concerns."
-            else:
-                feedback['message'] = "Simplify your language. Avoid excessive jargon and keep sentences concise."
-        else:
-            if word_count < 10:
-                feedback['message'] = "Your response is too short. Elaborate more to address the patient's concerns thoroughly."
-            else:
-                feedback['message'] = "Your response is unclear or too complex. Use simpler language and break down information into digestible parts."
-        
-        return feedback
     
-    def _get_suggestions(self, scores, message):
+    def _get_suggestions(self, empathy, accuracy, clarity, message):
         """Generate actionable suggestions for improvement."""
         suggestions = []
         
-        empathy = scores.get('empathy', 0)
-        accuracy = scores.get('accuracy', 0)
-        clarity = scores.get('clarity', 0)
-        
-        # Empathy suggestions
         if empathy < 0.6:
-            suggestions.append({
-                'category': 'Empathy',
-                'tip': "Start your response by acknowledging the patient's feelings: 'I understand why you might feel that way...'",
-                'example': "I can see why you're concerned about side effects. Many people share that worry, and it's completely valid."
-            })
+            suggestions.append(_SUGGESTION_EMPATHY)
         
-        # Accuracy suggestions
         if accuracy < 0.6:
-            suggestions.append({
-                'category': 'Accuracy',
-                'tip': "Include specific facts and data to support your points.",
-                'example': "Clinical trials with over 30,000 participants showed that the vaccine is over 90% effective and has a strong safety profile."
-            })
+            suggestions.append(_SUGGESTION_ACCURACY)
         
-        # Clarity suggestions
         if clarity < 0.6:
-            word_count = len(message.split())
-            if word_count < 15:
-                suggestions.append({
-                    'category': 'Clarity',
-                    'tip': "Provide more detailed information while staying focused.",
-                    'example': "Expand your response to include specific examples and explanations that address the patient's concern."
-                })
+            if len(message.split()) < 15:
+                suggestions.append(_SUGGESTION_CLARITY_EXPAND)
             else:
-                suggestions.append({
-                    'category': 'Clarity',
-                    'tip': "Keep your response concise and focused on 1-2 main points.",
-                    'example': "Break complex information into shorter, more digestible sentences."
-                })
+                suggestions.append(_SUGGESTION_CLARITY_FOCUS)
         
-        # Question suggestion
         if '?' not in message:
-            suggestions.append({
-                'category': 'Engagement',
-                'tip': "Ask follow-up questions to better understand the patient's concerns.",
-                'example': "What specifically worries you most about the vaccine?"
-            })
+            suggestions.append(_SUGGESTION_ENGAGEMENT)
         
         return suggestions[:3]  # Return top 3 suggestions
     
-    def _get_strengths(self, scores, message):
+    def _get_strengths(self, empathy, accuracy, clarity, message, acknowledges_perspective=None):
         """Identify strengths in the response."""
         strengths = []
         
-        empathy = scores.get('empathy', 0)
-        accuracy = scores.get('accuracy', 0)
-        clarity = scores.get('clarity', 0)
-        
         if empathy >= 0.7:
             strengths.append("Strong empathetic communication")
         
@@ -184,19 +204,14 @@ class FeedbackGenerator:
         if '?' in message:
             strengths.append("Good use of questions for engagement")
         
-        message_lower = message.lower()
-        if any(phrase in message_lower for phrase in ['understand', 'I hear', 'appreciate']):
+        if acknowledges_perspective is None:
+            # Same whole-word matching the scorer uses for the flag
+            acknowledges_perspective = _count_keywords(message.lower())['perspective'] > 0
+        if acknowledges_perspective:
             strengths.append("Acknowledges patient perspective")
         
         return strengths if strengths else ["Keep practicing to develop your strengths"]
     
     def _get_level(self, score):
         """Convert numerical score to level."""
-        if score >= 0.8:
-            return "Excellent"
-        elif score >= 0.65:
-            return "Good"
-        elif score >= 0.5:
-            return "Fair"
-        else:
-            return "Needs Improvement"
+        return _LEVELS[bisect_right(_LEVEL_THRESHOLDS, score)]
@@ -4,55 +4,332 @@ Analyzes student messages and scores them on empathy, accuracy, and clarity.
 """
 
 import re
-from textblob import TextBlob
-import nltk
-from nltk.sentiment import SentimentIntensityAnalyzer
+import string
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+import ahocorasick
+
+# Define keywords for different aspects
+_EMPATHY_KEYWORDS = (
+    'understand', 'feel', 'concern', 'worry', 'appreciate',
+    'valid', 'important', 'hear', 'listening', 'respect',
+    'I see', 'makes sense', 'thank you', 'natural', 'normal'
+)
+
+_ACCURACY_KEYWORDS = {
+    'vaccine_facts': (
+        'clinical trial', 'FDA approved', 'tested', 'study', 'research',
+        'data', 'evidence', 'scientist', 'peer-reviewed', 'effective'
+    ),
+    'safety_facts': (
+        'safe', 'monitored', 'side effects are', 'rare', 'temporary',
+        'benefits outweigh', 'millions', 'approved'
+    ),
+    'immune_system': (
+        'immune response', 'antibodies', 'protection', 'immunity',
+        'immune system', 'body\'s defense'
+    )
+}
+
+# Misinformation red flags
+_MISINFORMATION_FLAGS = (
+    'chip', 'tracking', 'DNA change', 'alter DNA', 'experimental',
+    'not tested', 'rushed', 'conspiracy'
+)
+
+# Phrases showing the student acknowledges the patient's perspective
+_ACKNOWLEDGMENT_PHRASES = ('your concern', 'your worry', 'you feel', 'you\'re')
+
+# Dismissive language (reduces empathy)
+_DISMISSIVE_PHRASES = ('just', 'simply', 'you should', 'you must', 'you need to')
+
+# Hedging language (shows appropriate caution)
+_HEDGING_WORDS = ('generally', 'typically', 'usually', 'most', 'many')
+
+# Technical terms - some are good, too many hurt clarity
+_JARGON_TERMS = ('immunoglobulin', 'mRNA', 'adjuvant', 'epitope',
+                 'pathogen', 'antigen', 'cytokine')
+
+# Clarity indicators
+_CLARITY_PHRASES = ('in other words', 'for example', 'this means',
+                    'let me explain', 'simply put')
+
+# Phrases the feedback generator credits as acknowledging the patient's perspective;
+# this is the only list of them, including when Scores carry no flag
+_PERSPECTIVE_PHRASES = ('understand', 'I hear', 'appreciate')
+
+# Specific data/numbers or references to studies
+_DATA_RE = re.compile(r'\d+%|\d+ percent|study|trial')
+
+# Turns punctuation into spaces so "safe." and "safe/effective" yield "safe"
+_PUNCTUATION_TABLE = str.maketrans(string.punctuation, ' ' * len(string.punctuation))
+
+# Number of distinct messages whose scores each scorer remembers
+_SCORE_CACHE_SIZE = 4096
+
+
+def _build_keyword_index():
+    """
+    Index every keyword list so a message is scanned once instead of once
+    per keyword.
+
+    Plain single-word keywords are matched against the message's words, so
+    'understand' does not fire inside 'misunderstanding'. Phrases and
+    keywords containing punctuation (e.g. "you're", 'peer-reviewed') go into
+    one Aho-Corasick automaton scanned over the whole message.
+
+    Returns:
+        tuple: (dict mapping each word to its categories, phrase automaton)
+    """
+    categories = {
+        'empathy': _EMPATHY_KEYWORDS,
+        'acknowledgment': _ACKNOWLEDGMENT_PHRASES,
+        'dismissive': _DISMISSIVE_PHRASES,
+        'accuracy': [keyword for keywords in _ACCURACY_KEYWORDS.values()
+                     for keyword in keywords],
+        'misinformation': _MISINFORMATION_FLAGS,
+        'hedging': _HEDGING_WORDS,
+        'jargon': _JARGON_TERMS,
+        'clarity': _CLARITY_PHRASES,
+        'perspective': _PERSPECTIVE_PHRASES
+    }
+
+    keyword_categories = {}
+    for category, keywords in categories.items():
+        for keyword in keywords:
+            keyword_categories.setdefault(keyword.lower(), []).append(category)
+
+    word_categories = {}
+    automaton = ahocorasick.Automaton()
+    for keyword, found_in in keyword_categories.items():
+        if keyword.isalnum():
+            word_categories[keyword] = tuple(found_in)
+        else:
+            automaton.add_word(keyword, (keyword, tuple(found_in)))
+    automaton.make_automaton()
+    return word_categories, automaton
+
+
+_WORD_CATEGORIES, _PHRASE_AUTOMATON = _build_keyword_index()
+
+
+@lru_cache(maxsize=None)
+def _get_sia():
+    """
+    Return the shared VADER analyzer.
+
+    NLTK and the VADER lexicon are slow to load, so they are imported on the
+    first call rather than with this module, and the analyzer is shared by
+    every scorer.
+    """
+    from nltk.sentiment import SentimentIntensityAnalyzer
+
+    _ensure_vader_lexicon()
+    return SentimentIntensityAnalyzer()
+
+
+def _ensure_vader_lexicon():
+    """Download the VADER lexicon unless NLTK can already find it."""
+    import nltk
+
+    try:
+        # nltk.download() stores the lexicon under this path, not a bare name
+        nltk.data.find('sentiment/vader_lexicon.zip')
+    except LookupError:
+        nltk.download('vader_lexicon', quiet=True)
+
+
+def _count_keywords(message_lower):
+    """
+    Count the distinct keywords of each category found in the message.
+
+    Returns:
+        Counter: Number of matching keywords per category
+    """
+    counts = Counter()
+    for word in set(message_lower.translate(_PUNCTUATION_TABLE).split()):
+        found_in = _WORD_CATEGORIES.get(word)
+        if found_in:
+            counts.update(found_in)
+
+    # The automaton matches substrings, so drop hits inside longer words
+    # ('i hear' in "i heard", 'you must' in "you mustn't")
+    found = {}
+    last = len(message_lower) - 1
+    for end, (keyword, found_in) in _PHRASE_AUTOMATON.iter(message_lower):
+        start = end - len(keyword) + 1
+        if start > 0 and message_lower[start - 1].isalnum():
+            continue
+        if end < last and message_lower[end + 1].isalnum():
+            continue
+        found[keyword] = found_in
+    for found_in in found.values():
+        counts.update(found_in)
+    return counts
+
+
+# The scoring formulas below take only numbers and flags; all string work
+# happens once in NLPScorer._score.
+
+def _empathy_from(empathy_count, acknowledges, compound, dismissive, engaging_question):
+    """
+    Score empathy based on keywords and sentiment.
+    
+    Returns:
+        float: Empathy score (0-1)
+    """
+    score = 0.5  # Base score
+    
+    # Boost score based on empathy keywords (up to 0.3)
+    score += min(0.3, empathy_count * 0.1)
+    
+    # Personal pronouns indicating acknowledgment
+    if acknowledges:
+        score += 0.15
+    
+    # Sentiment analysis - positive sentiment indicates empathetic tone
+    if compound > 0.1:
+        score += 0.1
+    elif compound < -0.1:
+        score -= 0.15
+    
+    # Dismissive language reduces empathy
+    if dismissive:
+        score -= 0.1
+    
+    # Questions can show engagement
+    if engaging_question:
+        score += 0.05
+    
+    return max(0.0, min(1.0, score))
+
+
+def _accuracy_from(accurate_count, misinformation, mentions_data, hedging):
+    """
+    Score accuracy based on factual content and absence of misinformation.
+    
+    Returns:
+        float: Accuracy score (0-1)
+    """
+    score = 0.5  # Base score
+    
+    # Boost for accurate information (up to 0.4)
+    score += min(0.4, accurate_count * 0.08)
+    
+    # Misinformation red flags
+    if misinformation:
+        score -= 0.3
+    
+    # Boost for mentioning specific data/numbers
+    if mentions_data:
+        score += 0.15
+    
+    # Hedging language shows appropriate caution
+    if hedging:
+        score += 0.05
+    
+    return max(0.0, min(1.0, score))
+
+
+def _clarity_from(word_count, sentence_count, jargon_count, clarity_phrase):
+    """
+    Score clarity based on readability and structure.
+    
+    Returns:
+        float: Clarity score (0-1)
+    """
+    score = 0.5  # Base score
+    
+    # Word count - should be substantial but not too long
+    if 15 <= word_count <= 60:
+        score += 0.2
+    elif word_count < 10:
+        score -= 0.2
+    elif word_count > 100:
+        score -= 0.15
+    
+    # Sentence count and structure
+    if 1 <= sentence_count <= 4:
+        score += 0.15
+    elif sentence_count > 6:
+        score -= 0.1
+    
+    # Only non-blank messages are scored, and they always form a sentence
+    score += 0.1
+    
+    # Jargon check - too much technical language reduces clarity
+    if jargon_count > 2:
+        score -= 0.15
+    elif jargon_count == 1:
+        score += 0.05  # Some technical terms are good
+    
+    # Clarity indicators
+    if clarity_phrase:
+        score += 0.1
+    
+    return max(0.0, min(1.0, score))
+
+
+@dataclass(frozen=True, slots=True)
+class Scores:
+    """
+    Scores for one student message (0-1 scale) plus the details derived from it.
+    
+    Instances are immutable, so the scorer's cache can return the same object
+    for repeated messages. Use as_dict() to serialize them.
+    """
+    empathy: float
+    accuracy: float
+    clarity: float
+    word_count: int = 0
+    has_question: bool = False
+    # None if unknown; the feedback generator then checks the message itself
+    acknowledges_perspective: Optional[bool] = None
+    # (compound, positive, negative, neutral); None if nothing was analyzed
+    sentiment: Optional[tuple] = None
+    
+    def as_dict(self):
+        """Return the scores in the JSON shape served by the API."""
+        details = {}
+        if self.sentiment is not None:
+            compound, positive, negative, neutral = self.sentiment
+            details = {
+                'word_count': self.word_count,
+                'has_question': self.has_question,
+                'acknowledges_perspective': self.acknowledges_perspective,
+                'sentiment': {
+                    'compound': compound,
+                    'positive': positive,
+                    'negative': negative,
+                    'neutral': neutral
+                }
+            }
+        
+        return {
+            'empathy': self.empathy,
+            'accuracy': self.accuracy,
+            'clarity': self.clarity,
+            'details': details
+        }
+
+
+_EMPTY_SCORES = Scores(empathy=0.0, accuracy=0.0, clarity=0.0)
 
 
 class NLPScorer:
     """Scores student responses using NLP techniques."""
     
     def __init__(self):
-        # Download required NLTK data
-        try:
-            nltk.data.find('vader_lexicon')
-        except LookupError:
-            nltk.download('vader_lexicon', quiet=True)
-
-        try:
-            nltk.data.find('tokenizers/punkt_tab')
-        except LookupError:
-            nltk.download('punkt_tab', quiet=True)
-        
-        self.sia = SentimentIntensityAnalyzer()
-        
-        # Define keywords for different aspects
-        self.empathy_keywords = [
-            'understand', 'feel', 'concern', 'worry', 'appreciate',
-            'valid', 'important', 'hear', 'listening', 'respect',
-            'I see', 'makes sense', 'thank you', 'natural', 'normal'
-        ]
-        
-        self.accuracy_keywords = {
-            'vaccine_facts': [
-                'clinical trial', 'FDA approved', 'tested', 'study', 'research',
-                'data', 'evidence', 'scientist', 'peer-reviewed', 'effective'
-            ],
-            'safety_facts': [
-                'safe', 'monitored', 'side effects are', 'rare', 'temporary',
-                'benefits outweigh', 'millions', 'approved'
-            ],
-            'immune_system': [
-                'immune response', 'antibodies', 'protection', 'immunity',
-                'immune system', 'body\'s defense'
-            ]
-        }
-        
-        # Misinformation red flags
-        self.misinformation_flags = [
-            'chip', 'tracking', 'DNA change', 'alter DNA', 'experimental',
-            'not tested', 'rushed', 'conspiracy'
-        ]
+        self.sia = _get_sia()
+        # Scoring is a pure function of the text, so repeated messages are
+        # answered from a per-scorer LRU cache
+        self._score_cached = lru_cache(maxsize=_SCORE_CACHE_SIZE)(self._score)
+    
+    def clear_cache(self):
+        """Forget all cached message scores."""
+        self._score_cached.cache_clear()
     
     def score_message(self, message, session_id=None):
         """
@@ -63,162 +340,71 @@ class NLPScorer:
             session_id: Optional session ID for context
             
         Returns:
-            dict: Scores for empathy, accuracy, and clarity (0-1 scale)
+            Scores: Scores for empathy, accuracy, and clarity (0-1 scale)
         """
         if not message or not message.strip():
-            return {
-                'empathy': 0.0,
-                'accuracy': 0.0,
-                'clarity': 0.0,
-                'details': {}
-            }
+            return _EMPTY_SCORES
         
-        empathy_score = self._score_empathy(message)
-        accuracy_score = self._score_accuracy(message)
-        clarity_score = self._score_clarity(message)
-        
-        return {
-            'empathy': round(empathy_score, 2),
-            'accuracy': round(accuracy_score, 2),
-            'clarity': round(clarity_score, 2),
-            'details': {
-                'word_count': len(message.split()),
-                'has_question': '?' in message,
-                'sentiment': self._get_sentiment(message)
-            }
-        }
+        return self._score_cached(message.strip())
     
-    def _score_empathy(self, message):
-        """
-        Score empathy based on keywords and sentiment.
-        
-        Returns:
-            float: Empathy score (0-1)
+    def score_messages(self, messages):
         """
-        message_lower = message.lower()
-        score = 0.5  # Base score
-        
-        # Check for empathy keywords
-        empathy_count = sum(1 for keyword in self.empathy_keywords 
-                           if keyword.lower() in message_lower)
-        
-        # Boost score based on empathy keywords (up to 0.3)
-        score += min(0.3, empathy_count * 0.1)
+        Score several messages, e.g. every student turn of a transcript.
         
-        # Check for personal pronouns indicating acknowledgment
-        if any(phrase in message_lower for phrase in ['your concern', 'your worry', 'you feel', 'you\'re']):
-            score += 0.15
-        
-        # Sentiment analysis - positive sentiment indicates empathetic tone
-        sentiment = self.sia.polarity_scores(message)
-        if sentiment['compound'] > 0.1:
-            score += 0.1
-        elif sentiment['compound'] < -0.1:
-            score -= 0.15
-        
-        # Check for dismissive language (reduces empathy)
-        dismissive_phrases = ['just', 'simply', 'you should', 'you must', 'you need to']
-        if any(phrase in message_lower for phrase in dismissive_phrases):
-            score -= 0.1
-        
-        # Questions can show engagement
-        if '?' in message and 'why' not in message_lower:
-            score += 0.05
-        
-        return max(0.0, min(1.0, score))
-    
-    def _score_accuracy(self, message):
-        """
-        Score accuracy based on factual content and absence of misinformation.
+        Repeated messages are only scored once.
         
+        Args:
+            messages: Iterable of student messages
+            
         Returns:
-            float: Accuracy score (0-1)
+            list: One Scores per message, in the same order
         """
-        message_lower = message.lower()
-        score = 0.5  # Base score
-        
-        # Check for accurate information
-        accurate_keywords = 0
-        for category, keywords in self.accuracy_keywords.items():
-            for keyword in keywords:
-                if keyword.lower() in message_lower:
-                    accurate_keywords += 1
-        
-        # Boost for accurate information (up to 0.4)
-        score += min(0.4, accurate_keywords * 0.08)
-        
-        # Check for misinformation red flags
-        misinformation_count = sum(1 for flag in self.misinformation_flags 
-                                   if flag.lower() in message_lower)
-        if misinformation_count > 0:
-            score -= 0.3
-        
-        # Boost for mentioning specific data/numbers
-        if re.search(r'\d+%|\d+ percent', message_lower) or 'study' in message_lower or 'trial' in message_lower:
-            score += 0.15
-        
-        # Check for hedging language (shows appropriate caution)
-        hedging = ['generally', 'typically', 'usually', 'most', 'many']
-        if any(word in message_lower for word in hedging):
-            score += 0.05
-        
-        return max(0.0, min(1.0, score))
+        return [self.score_message(message) for message in messages]
     
-    def _score_clarity(self, message):
+    def _score(self, message):
         """
-        Score clarity based on readability and structure.
+        Score a non-empty message.
+        
+        The message is lowercased, split, scanned for keywords and run through
+        VADER once; the three scores are computed from those shared features.
         
         Returns:
-            float: Clarity score (0-1)
+            Scores: Scores and details for the message
         """
-        score = 0.5  # Base score
-        
-        # Word count - should be substantial but not too long
+        message_lower = message.lower()
         word_count = len(message.split())
-        if 15 <= word_count <= 60:
-            score += 0.2
-        elif word_count < 10:
-            score -= 0.2
-        elif word_count > 100:
-            score -= 0.15
-        
-        # Sentence count and structure
-        sentences = message.split('.')
-        sentence_count = len([s for s in sentences if s.strip()])
-        
-        if 1 <= sentence_count <= 4:
-            score += 0.15
-        elif sentence_count > 6:
-            score -= 0.1
-        
-        # Check for proper sentence structure
-        blob = TextBlob(message)
-        if len(blob.sentences) > 0:
-            score += 0.1
-        
-        # Jargon check - too much technical language reduces clarity
-        jargon_terms = ['immunoglobulin', 'mRNA', 'adjuvant', 'epitope', 
-                       'pathogen', 'antigen', 'cytokine']
-        jargon_count = sum(1 for term in jargon_terms if term.lower() in message.lower())
-        if jargon_count > 2:
-            score -= 0.15
-        elif jargon_count == 1:
-            score += 0.05  # Some technical terms are good
+        sentence_count = max(1, message.count('.') + message.count('!') + message.count('?'))
+        has_question = '?' in message
+        sentiment = self.sia.polarity_scores(message)
+        counts = _count_keywords(message_lower)
         
-        # Check for clarity indicators
-        clarity_phrases = ['in other words', 'for example', 'this means', 
-                          'let me explain', 'simply put']
-        if any(phrase in message.lower() for phrase in clarity_phrases):
-            score += 0.1
+        empathy = _empathy_from(
+            counts['empathy'],
+            counts['acknowledgment'] > 0,
+            sentiment['compound'],
+            counts['dismissive'] > 0,
+            has_question and 'why' not in message_lower
+        )
+        accuracy = _accuracy_from(
+            counts['accuracy'],
+            counts['misinformation'] > 0,
+            _DATA_RE.search(message_lower) is not None,
+            counts['hedging'] > 0
+        )
+        clarity = _clarity_from(
+            word_count,
+            sentence_count,
+            counts['jargon'],
+            counts['clarity'] > 0
+        )
         
-        return max(0.0, min(1.0, score))
-    
-    def _get_sentiment(self, message):
-        """Get sentiment analysis of the message."""
-        sentiment = self.sia.polarity_scores(message)
-        return {
-            'compound': round(sentiment['compound'], 2),
-            'positive': round(sentiment['pos'], 2),
-            'negative': round(sentiment['neg'], 2),
-            'neutral': round(sentiment['neu'], 2)
-        }
+        return Scores(
+            empathy=round(empathy, 2),
+            accuracy=round(accuracy, 2),
+            clarity=round(clarity, 2),
+            word_count=word_count,
+            has_question=has_question,
+            acknowledges_perspective=counts['perspective'] > 0,
+            sentiment=(round(sentiment['compound'], 2), round(sentiment['pos'], 2),
+                       round(sentiment['neg'], 2), round(sentiment['neu'], 2))
+        )
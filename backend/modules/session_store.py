@@ -0,0 +1,274 @@
+"""
+Session Store Module
+Keeps the state of active training sessions, cached LLM responses and queued
+message tasks. When REDIS_URL is set all of them are stored in Redis, so every
+server worker sees the same sessions and tasks and idle ones expire on their
+own; otherwise they are kept in process memory.
+"""
+
+import os
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+try:
+    import redis
+    _redis_available = True
+except ImportError:
+    _redis_available = False
+
+logger = logging.getLogger(__name__)
+
+
+class InMemorySessionStore:
+    """
+    Stores sessions in a dictionary local to the current process.
+
+    Alongside the full conversation log each session keeps a bounded deque of
+    its last `context_size` turns, which is all the LLM prompt ever needs.
+    """
+
+    # Maximum number of LLM responses kept in the LRU cache
+    _MAX_CACHED_RESPONSES = 1024
+
+    # Maximum number of queued message tasks kept, oldest dropped first
+    _MAX_TASKS = 10000
+
+    def __init__(self, context_size=8, task_ttl_seconds=600):
+        self._sessions = {}
+        self._context_size = context_size
+        self._response_cache = OrderedDict()
+        # The cache is shared by request threads and the message executor
+        self._cache_lock = threading.Lock()
+        self._task_ttl = task_ttl_seconds
+        self._tasks = OrderedDict()
+        self._session_tasks = {}
+        # Tasks are written from background threads as well as requests
+        self._tasks_lock = threading.Lock()
+
+    def __contains__(self, session_id):
+        return session_id in self._sessions
+
+    def create(self, session_id, state):
+        """Create a session with the given state fields."""
+        self._sessions[session_id] = {
+            'state': dict(state),
+            'conversation_history': [],
+            'recent_history': deque(maxlen=self._context_size)
+        }
+
+    def get(self, session_id):
+        """Return a copy of the session state, or None if it does not exist."""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        return dict(session['state'])
+
+    def update(self, session_id, **fields):
+        """Overwrite the given state fields."""
+        self._sessions[session_id]['state'].update(fields)
+
+    def append_history(self, session_id, *entries):
+        """Append one or more conversation turns to the session history."""
+        session = self._sessions[session_id]
+        session['conversation_history'].extend(entries)
+        session['recent_history'].extend(entries)
+
+    def recent_history(self, session_id, count):
+        """Return the last `count` conversation turns (at most `context_size`)."""
+        return list(self._sessions[session_id]['recent_history'])[-count:]
+
+    def history(self, session_id):
+        """Return the full conversation history."""
+        return self._sessions[session_id]['conversation_history']
+
+    def delete(self, session_id):
+        """Remove a session."""
+        self._sessions.pop(session_id, None)
+
+    def get_cached_response(self, key):
+        """Return a cached LLM response, or None."""
+        with self._cache_lock:
+            response = self._response_cache.get(key)
+            if response is not None:
+                self._response_cache.move_to_end(key)
+        return response
+
+    def cache_response(self, key, response):
+        """Cache an LLM response, evicting the least recently used entry if full."""
+        with self._cache_lock:
+            self._response_cache[key] = response
+            self._response_cache.move_to_end(key)
+            if len(self._response_cache) > self._MAX_CACHED_RESPONSES:
+                self._response_cache.popitem(last=False)
+
+    def set_task(self, task_id, task):
+        """Store the status of a queued message task until the task TTL expires."""
+        now = time.monotonic()
+        with self._tasks_lock:
+            self._tasks.pop(task_id, None)
+            self._tasks[task_id] = (now + self._task_ttl, task)
+            # Tasks are kept in write order, so expired ones are at the front
+            while self._tasks:
+                oldest_id, (expires_at, _) = next(iter(self._tasks.items()))
+                if expires_at > now and len(self._tasks) <= self._MAX_TASKS:
+                    break
+                del self._tasks[oldest_id]
+
+    def get_task(self, task_id):
+        """Return the status of a queued message task, or None."""
+        entry = self._tasks.get(task_id)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def delete_task(self, task_id):
+        """Remove a queued message task."""
+        with self._tasks_lock:
+            self._tasks.pop(task_id, None)
+
+    def start_session_task(self, session_id, task_id):
+        """
+        Mark a queued message task as running for the session.
+
+        Returns False if the session already has one, so turns of a session
+        never overlap. The mark expires with the task TTL.
+        """
+        now = time.monotonic()
+        with self._tasks_lock:
+            running = self._session_tasks.get(session_id)
+            if running is not None and running[0] > now:
+                return False
+            self._session_tasks[session_id] = (now + self._task_ttl, task_id)
+            return True
+
+    def finish_session_task(self, session_id):
+        """Clear the session's running message task."""
+        with self._tasks_lock:
+            self._session_tasks.pop(session_id, None)
+
+
+class RedisSessionStore:
+    """
+    Stores sessions in Redis.
+
+    Each session uses a hash for its state fields (JSON-encoded values) plus a
+    list for the conversation history, so recording a turn is a single RPUSH
+    rather than rewriting the whole session. Every write refreshes the expiry
+    on both keys.
+    """
+
+    def __init__(self, client, ttl_seconds=3600, cache_ttl_seconds=86400, task_ttl_seconds=600):
+        self._redis = client
+        self._ttl = ttl_seconds
+        self._cache_ttl = cache_ttl_seconds
+        self._task_ttl = task_ttl_seconds
+
+    @staticmethod
+    def _keys(session_id):
+        base = f'session:{session_id}'
+        return base, f'{base}:history'
+
+    def _touch(self, pipe, session_id):
+        for key in self._keys(session_id):
+            pipe.expire(key, self._ttl)
+
+    def __contains__(self, session_id):
+        return bool(self._redis.exists(self._keys(session_id)[0]))
+
+    def create(self, session_id, state):
+        """Create a session with the given state fields."""
+        state_key, _ = self._keys(session_id)
+        pipe = self._redis.pipeline()
+        pipe.hset(state_key, mapping={k: json.dumps(v) for k, v in state.items()})
+        self._touch(pipe, session_id)
+        pipe.execute()
+
+    def get(self, session_id):
+        """Return the session state, or None if it does not exist."""
+        raw = self._redis.hgetall(self._keys(session_id)[0])
+        if not raw:
+            return None
+        return {k.decode(): json.loads(v) for k, v in raw.items()}
+
+    def update(self, session_id, **fields):
+        """Overwrite the given state fields."""
+        pipe = self._redis.pipeline()
+        pipe.hset(self._keys(session_id)[0], mapping={k: json.dumps(v) for k, v in fields.items()})
+        self._touch(pipe, session_id)
+        pipe.execute()
+
+    def append_history(self, session_id, *entries):
+        """Append one or more conversation turns to the session history."""
+        pipe = self._redis.pipeline()
+        pipe.rpush(self._keys(session_id)[1], *(json.dumps(entry) for entry in entries))
+        self._touch(pipe, session_id)
+        pipe.execute()
+
+    def recent_history(self, session_id, count):
+        """Return the last `count` conversation turns."""
+        raw = self._redis.lrange(self._keys(session_id)[1], -count, -1)
+        return [json.loads(item) for item in raw]
+
+    def history(self, session_id):
+        """Return the full conversation history."""
+        raw = self._redis.lrange(self._keys(session_id)[1], 0, -1)
+        return [json.loads(item) for item in raw]
+
+    def delete(self, session_id):
+        """Remove a session."""
+        self._redis.delete(*self._keys(session_id))
+
+    def get_cached_response(self, key):
+        """Return a cached LLM response, or None."""
+        response = self._redis.get(f'llm:{key}')
+        return response.decode() if response is not None else None
+
+    def cache_response(self, key, response):
+        """Cache an LLM response until the cache TTL expires."""
+        self._redis.setex(f'llm:{key}', self._cache_ttl, response)
+
+    def set_task(self, task_id, task):
+        """Store the status of a queued message task until the task TTL expires."""
+        self._redis.setex(f'task:{task_id}', self._task_ttl, json.dumps(task))
+
+    def get_task(self, task_id):
+        """Return the status of a queued message task, or None."""
+        raw = self._redis.get(f'task:{task_id}')
+        return json.loads(raw) if raw is not None else None
+
+    def delete_task(self, task_id):
+        """Remove a queued message task."""
+        self._redis.delete(f'task:{task_id}')
+
+    def start_session_task(self, session_id, task_id):
+        """
+        Mark a queued message task as running for the session.
+
+        Returns False if the session already has one, so turns of a session
+        never overlap, whichever worker queued them. SET NX makes the check
+        atomic, and the mark expires with the task TTL.
+        """
+        return bool(self._redis.set(f'session-task:{session_id}', task_id,
+                                    nx=True, ex=self._task_ttl))
+
+    def finish_session_task(self, session_id):
+        """Clear the session's running message task."""
+        self._redis.delete(f'session-task:{session_id}')
+
+
+def create_session_store(context_size=8):
+    """Return a Redis-backed store if REDIS_URL is configured, else an in-memory one."""
+    redis_url = os.environ.get('REDIS_URL')
+    task_ttl = int(os.environ.get('TASK_TTL_SECONDS', '600'))
+    if not redis_url or not _redis_available:
+        return InMemorySessionStore(context_size=context_size, task_ttl_seconds=task_ttl)
+    ttl = int(os.environ.get('SESSION_TTL_SECONDS', '3600'))
+    cache_ttl = int(os.environ.get('LLM_CACHE_TTL_SECONDS', '86400'))
+    logger.info("Using Redis session store")
+    return RedisSessionStore(
+        redis.Redis.from_url(redis_url), ttl_seconds=ttl, cache_ttl_seconds=cache_ttl,
+        task_ttl_seconds=task_ttl
+    )
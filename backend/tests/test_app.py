@@ -0,0 +1,144 @@
+"""
+Tests for the Flask API endpoints
+"""
+
+import unittest
+import sys
+import os
+import io
+import threading
+import time
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import app as app_module
+
+
+class TestSendMessageAsync(unittest.TestCase):
+    def setUp(self):
+        self.client = app_module.app.test_client()
+        self.release = threading.Event()
+
+    def _blocked_process_message(self, session_id, student_message):
+        self.release.wait(5)
+        return {'patient_message': 'Okay.', 'scores': {'empathy': 0.5}, 'feedback': {}}
+
+    def _queue(self):
+        response = self.client.post('/api/send-message-async',
+                                    json={'session_id': 'abc', 'message': 'Hello.'})
+        self.assertEqual(response.status_code, 202)
+        return response.get_json()['status_url']
+
+    def _wait_until_finished(self, status_url):
+        for _ in range(100):
+            response = self.client.get(status_url)
+            if response.status_code != 202:
+                return response
+            time.sleep(0.02)
+        self.fail('task did not finish')
+
+    def test_pending_then_done_then_unknown(self):
+        """Test that a queued message is pending, then handed out once"""
+        with patch.object(app_module, '_process_message', self._blocked_process_message):
+            status_url = self._queue()
+
+            pending = self.client.get(status_url)
+            self.assertEqual(pending.status_code, 202)
+            self.assertEqual(pending.get_json()['status'], 'pending')
+
+            self.release.set()
+            done = self._wait_until_finished(status_url)
+
+        self.assertEqual(done.status_code, 200)
+        self.assertEqual(done.get_json()['status'], 'done')
+        self.assertEqual(done.get_json()['patient_message'], 'Okay.')
+        self.assertEqual(self.client.get(status_url).status_code, 404)
+
+    def test_second_message_for_session_waits_for_first(self):
+        """Test that a session cannot queue a message while one is pending"""
+        with patch.object(app_module, '_process_message', self._blocked_process_message):
+            status_url = self._queue()
+            
+            busy = self.client.post('/api/send-message-async',
+                                    json={'session_id': 'abc', 'message': 'Are you there?'})
+            self.assertEqual(busy.status_code, 409)
+            
+            self.release.set()
+            self._wait_until_finished(status_url)
+            self._wait_until_finished(self._queue())
+    
+    def test_failed_task(self):
+        """Test that a failed task reports an error once"""
+        def fail(session_id, student_message):
+            raise ValueError('Invalid session ID')
+
+        with patch.object(app_module, '_process_message', fail):
+            status_url = self._queue()
+            failed = self._wait_until_finished(status_url)
+
+        self.assertEqual(failed.status_code, 500)
+        self.assertEqual(self.client.get(status_url).status_code, 404)
+
+    def test_missing_message(self):
+        """Test that a request without a message is rejected"""
+        response = self.client.post('/api/send-message-async', json={'session_id': 'abc'})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_store_error_returns_json(self):
+        """Test that a failing task store gives a JSON error"""
+        with patch.object(app_module.task_store, 'get_task', side_effect=ConnectionError('down')):
+            response = self.client.get('/api/message-status/abc')
+        
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(response.get_json()['success'])
+    
+    def test_unknown_task(self):
+        """Test that an unknown task_id is not found"""
+        response = self.client.get('/api/message-status/missing')
+
+        self.assertEqual(response.status_code, 404)
+
+
+class TestTranscribeSpeech(unittest.TestCase):
+    def setUp(self):
+        self.client = app_module.app.test_client()
+
+    def test_raw_audio_body(self):
+        """Test that a raw audio request body is accepted"""
+        response = self.client.post('/api/transcribe-speech', data=b'\x1a\x45\xdf\xa3' * 100,
+                                    content_type='audio/webm')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.get_json()['success'])
+
+    def test_multipart_audio_file(self):
+        """Test that a multipart upload with an audio file is accepted"""
+        response = self.client.post('/api/transcribe-speech',
+                                    data={'audio': (io.BytesIO(b'RIFF' * 100), 'speech.wav')},
+                                    content_type='multipart/form-data')
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_empty_raw_body(self):
+        """Test that an empty request body is rejected"""
+        response = self.client.post('/api/transcribe-speech', data=b'', content_type='audio/webm')
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_multipart_without_audio(self):
+        """Test that multipart uploads need an audio file with data"""
+        missing = self.client.post('/api/transcribe-speech', data={'other': 'x'},
+                                   content_type='multipart/form-data')
+        empty = self.client.post('/api/transcribe-speech',
+                                 data={'audio': (io.BytesIO(b''), 'speech.wav')},
+                                 content_type='multipart/form-data')
+
+        self.assertEqual(missing.status_code, 400)
+        self.assertEqual(empty.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,12 +5,15 @@ Tests for the Conversation Simulator module
 import unittest
 import sys
 import os
+from datetime import datetime
 from unittest.mock import MagicMock, patch
 
 # Add parent directory to path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+from modules import conversation_simulator
 from modules.conversation_simulator import ConversationSimulator
+from modules.nlp_scorer import Scores
 
 
 class TestConversationSimulator(unittest.TestCase):
@@ -30,20 +33,54 @@ class TestConversationSimulator(unittest.TestCase):
         session_id, _ = self.simulator.start_session('default')
         
         student_message = "I understand your concerns about side effects."
-        scores = {'empathy': 0.8, 'accuracy': 0.7, 'clarity': 0.75}
+        scores = Scores(empathy=0.8, accuracy=0.7, clarity=0.75)
         
         response = self.simulator.get_response(session_id, student_message, scores)
         
         self.assertIsInstance(response, str)
         self.assertGreater(len(response), 0)
     
+    def test_rule_based_response_follows_openness_and_topic(self):
+        """Test that rule-based replies are picked by openness band and topic"""
+        session = {'persona': self.simulator.personas['default'], 'turn_count': 1}
+        scores = Scores(empathy=0.5, accuracy=0.5, clarity=0.5)
+
+        medium = self.simulator._generate_rule_based_response(
+            dict(session, openness_level=0.5), "Serious SIDE EFFECTS are rare.", scores)
+        high = self.simulator._generate_rule_based_response(
+            dict(session, openness_level=0.8), "Serious side effects are rare.", scores)
+
+        self.assertIn(medium, conversation_simulator._MID_OPENNESS_SIDE_EFFECTS)
+        self.assertIn(high, conversation_simulator._HIGH_OPENNESS)
+
+    def test_turn_is_recorded_before_response_returns(self):
+        """Test that both sides of a turn are in the history once the response is returned"""
+        session_id, _ = self.simulator.start_session('default')
+        scores = Scores(empathy=0.8, accuracy=0.7, clarity=0.75)
+        
+        response = self.simulator.get_response(session_id, "I understand your concerns.", scores)
+        
+        history = self.simulator.sessions.history(session_id)
+        self.assertEqual([turn['speaker'] for turn in history], ['patient', 'student', 'patient'])
+        self.assertEqual(history[-1]['message'], response)
+    
+    def test_begin_turn_leaves_stored_totals_until_update(self):
+        """Test that scoring a turn does not change the stored totals in place"""
+        session_id, _ = self.simulator.start_session('default')
+        scores = Scores(empathy=0.9, accuracy=0.9, clarity=0.9)
+        
+        with patch.object(self.simulator.sessions, 'update'):
+            self.simulator._begin_turn(session_id, "Hello.", scores)
+        
+        self.assertEqual(self.simulator.sessions.get(session_id)['score_totals']['empathy'], 0)
+    
     def test_end_session(self):
         """Test ending a session"""
         session_id, _ = self.simulator.start_session('default')
         
         # Send a few messages
         student_message = "I understand your concerns."
-        scores = {'empathy': 0.8, 'accuracy': 0.7, 'clarity': 0.75}
+        scores = Scores(empathy=0.8, accuracy=0.7, clarity=0.75)
         self.simulator.get_response(session_id, student_message, scores)
         
         summary = self.simulator.end_session(session_id)
@@ -54,6 +91,31 @@ class TestConversationSimulator(unittest.TestCase):
         self.assertIn('average_scores', summary)
         self.assertNotIn(session_id, self.simulator.sessions)
 
+    def test_end_session_average_scores(self):
+        """Test that the summary averages the scores of every turn"""
+        session_id, _ = self.simulator.start_session('default')
+        self.simulator.get_response(session_id, "Hello.", Scores(empathy=0.8, accuracy=0.6, clarity=0.5))
+        self.simulator.get_response(session_id, "Hello.", Scores(empathy=0.4, accuracy=0.2, clarity=0.7))
+
+        avg = self.simulator.end_session(session_id)['average_scores']
+
+        self.assertAlmostEqual(avg['empathy'], 0.6)
+        self.assertAlmostEqual(avg['accuracy'], 0.4)
+        self.assertAlmostEqual(avg['clarity'], 0.6)
+
+    def test_end_session_history_timestamps(self):
+        """Test that the summary history carries ISO timestamps"""
+        session_id, _ = self.simulator.start_session('default')
+        scores = Scores(empathy=0.8, accuracy=0.7, clarity=0.75)
+        self.simulator.get_response(session_id, "I understand your concerns.", scores)
+
+        summary = self.simulator.end_session(session_id)
+
+        self.assertEqual(len(summary['conversation_history']), 3)
+        for turn in summary['conversation_history']:
+            datetime.fromisoformat(turn['timestamp'])
+        self.assertGreaterEqual(summary['duration_minutes'], 0)
+
     # ------------------------------------------------------------------
     # LLM persona tests
     # ------------------------------------------------------------------
@@ -81,12 +143,46 @@ class TestConversationSimulator(unittest.TestCase):
         self.assertIsNotNone(simulator._llm_client)
 
         session_id, _ = simulator.start_session('default')
-        scores = {'empathy': 0.7, 'accuracy': 0.65, 'clarity': 0.7}
+        scores = Scores(empathy=0.7, accuracy=0.65, clarity=0.7)
         response = simulator.get_response(session_id, "The vaccine is well-tested.", scores)
 
         self.assertEqual(response, llm_reply)
         mock_client.chat.completions.create.assert_called_once()
 
+    @patch.dict(os.environ, {'OPENAI_API_KEY': 'test-key'})
+    @patch('modules.conversation_simulator.OpenAI')
+    def test_llm_response_cached_for_identical_prompt(self, mock_openai_cls):
+        """An identical prompt is answered from the cache without a second LLM call."""
+        mock_client = MagicMock()
+        mock_client.chat.completions.create.return_value = self._make_llm_response("Hmm, okay.")
+        mock_openai_cls.return_value = mock_client
+
+        simulator = ConversationSimulator()
+        scores = Scores(empathy=0.5, accuracy=0.5, clarity=0.5)
+        responses = []
+        for _ in range(2):
+            session_id, _ = simulator.start_session('default')
+            responses.append(simulator.get_response(session_id, "The vaccine is well-tested.", scores))
+
+        self.assertEqual(responses, ["Hmm, okay.", "Hmm, okay."])
+        mock_client.chat.completions.create.assert_called_once()
+
+    @patch.dict(os.environ, {'OPENAI_API_KEY': 'test-key'})
+    @patch('modules.conversation_simulator.OpenAI')
+    def test_trivial_message_skips_llm(self, mock_openai_cls):
+        """Pleasantries are answered by the rule-based engine without an LLM call."""
+        mock_client = MagicMock()
+        mock_openai_cls.return_value = mock_client
+
+        simulator = ConversationSimulator()
+        session_id, _ = simulator.start_session('default')
+        scores = Scores(empathy=0.5, accuracy=0.5, clarity=0.5)
+        response = simulator.get_response(session_id, "Okay, thanks!", scores)
+
+        self.assertGreater(len(response), 0)
+        mock_client.chat.completions.create.assert_not_called()
+        self.assertFalse(simulator._is_trivial_message("Why not?"))
+
     def test_no_llm_client_without_api_key(self):
         """Without OPENAI_API_KEY the LLM client is None and rule-based is used."""
         env = {k: v for k, v in os.environ.items() if k != 'OPENAI_API_KEY'}
@@ -95,7 +191,7 @@ class TestConversationSimulator(unittest.TestCase):
         self.assertIsNone(simulator._llm_client)
 
         session_id, _ = simulator.start_session('default')
-        scores = {'empathy': 0.5, 'accuracy': 0.5, 'clarity': 0.5}
+        scores = Scores(empathy=0.5, accuracy=0.5, clarity=0.5)
         response = simulator.get_response(session_id, "Vaccines are safe.", scores)
         self.assertIsInstance(response, str)
         self.assertGreater(len(response), 0)
@@ -110,7 +206,7 @@ class TestConversationSimulator(unittest.TestCase):
 
         simulator = ConversationSimulator()
         session_id, _ = simulator.start_session('default')
-        scores = {'empathy': 0.5, 'accuracy': 0.5, 'clarity': 0.5}
+        scores = Scores(empathy=0.5, accuracy=0.5, clarity=0.5)
         response = simulator.get_response(session_id, "Vaccines are safe.", scores)
 
         self.assertIsInstance(response, str)
@@ -126,7 +222,7 @@ class TestConversationSimulator(unittest.TestCase):
 
         simulator = ConversationSimulator()
         session_id, _ = simulator.start_session('misinformation')
-        scores = {'empathy': 0.5, 'accuracy': 0.5, 'clarity': 0.5}
+        scores = Scores(empathy=0.5, accuracy=0.5, clarity=0.5)
         simulator.get_response(session_id, "Let me address your concerns.", scores)
 
         call_kwargs = mock_client.chat.completions.create.call_args
@@ -135,6 +231,69 @@ class TestConversationSimulator(unittest.TestCase):
         self.assertIn('Robert', system_content)
         self.assertIn('distrustful', system_content)
 
+    @patch.dict(os.environ, {'OPENAI_API_KEY': 'test-key'})
+    @patch('modules.conversation_simulator.OpenAI')
+    def test_llm_context_includes_previous_turn_once(self, mock_openai_cls):
+        """Earlier turns are in the LLM context and the new message appears once."""
+        mock_client = MagicMock()
+        mock_client.chat.completions.create.return_value = self._make_llm_response("Hmm, okay.")
+        mock_openai_cls.return_value = mock_client
+
+        simulator = ConversationSimulator()
+        session_id, _ = simulator.start_session('default')
+        scores = Scores(empathy=0.5, accuracy=0.5, clarity=0.5)
+        simulator.get_response(session_id, "The vaccine is well-tested.", scores)
+        simulator.get_response(session_id, "Side effects are usually mild.", scores)
+
+        messages = mock_client.chat.completions.create.call_args.kwargs['messages']
+        contents = [m['content'] for m in messages[1:]]
+        self.assertEqual(contents[-3:], [
+            "The vaccine is well-tested.", "Hmm, okay.", "Side effects are usually mild."
+        ])
+        self.assertEqual(contents.count("Side effects are usually mild."), 1)
+
+    def _make_llm_stream(self, parts):
+        """Helper: build a mock OpenAI streaming response."""
+        chunks = []
+        for part in parts:
+            choice = MagicMock()
+            choice.delta.content = part
+            chunk = MagicMock()
+            chunk.choices = [choice]
+            chunks.append(chunk)
+        return iter(chunks)
+
+    @patch.dict(os.environ, {'OPENAI_API_KEY': 'test-key'})
+    @patch('modules.conversation_simulator.OpenAI')
+    def test_stream_response_yields_llm_chunks(self, mock_openai_cls):
+        """Streamed LLM chunks are passed through and recorded once complete."""
+        mock_client = MagicMock()
+        mock_client.chat.completions.create.return_value = self._make_llm_stream(["I'm still ", "not sure."])
+        mock_openai_cls.return_value = mock_client
+
+        simulator = ConversationSimulator()
+        session_id, _ = simulator.start_session('default')
+        scores = Scores(empathy=0.5, accuracy=0.5, clarity=0.5)
+        chunks = list(simulator.stream_response(session_id, "The vaccine is well-tested.", scores))
+
+        self.assertEqual(chunks, ["I'm still ", "not sure."])
+        self.assertTrue(mock_client.chat.completions.create.call_args.kwargs.get('stream'))
+        history = simulator.end_session(session_id)['conversation_history']
+        self.assertEqual(history[-1]['message'], "I'm still not sure.")
+
+    def test_stream_response_rule_based(self):
+        """Without an LLM the rule-based response is streamed as one chunk."""
+        env = {k: v for k, v in os.environ.items() if k != 'OPENAI_API_KEY'}
+        with patch.dict(os.environ, env, clear=True):
+            simulator = ConversationSimulator()
+        session_id, _ = simulator.start_session('default')
+        scores = Scores(empathy=0.5, accuracy=0.5, clarity=0.5)
+        chunks = list(simulator.stream_response(session_id, "Vaccines are safe.", scores))
+
+        self.assertEqual(len(chunks), 1)
+        history = simulator.end_session(session_id)['conversation_history']
+        self.assertEqual(history[-1]['message'], chunks[0])
+
     @patch.dict(os.environ, {'OPENAI_API_KEY': 'test-key', 'OPENAI_BASE_URL': 'http://localhost:11434/v1'})
     @patch('modules.conversation_simulator.OpenAI')
     def test_custom_base_url_passed_to_client(self, mock_openai_cls):
@@ -145,5 +304,29 @@ class TestConversationSimulator(unittest.TestCase):
         self.assertEqual(kwargs.get('base_url'), 'http://localhost:11434/v1')
 
 
+    @patch.dict(os.environ, {'OPENAI_API_KEY': 'test-key'})
+    @patch('modules.conversation_simulator.OpenAI')
+    def test_warm_up_sends_one_token_request(self, mock_openai_cls):
+        """warm_up makes a single one-token request and swallows failures."""
+        mock_client = MagicMock()
+        mock_client.chat.completions.create.side_effect = RuntimeError("API error")
+        mock_openai_cls.return_value = mock_client
+
+        ConversationSimulator().warm_up()
+
+        self.assertEqual(mock_client.chat.completions.create.call_args.kwargs.get('max_tokens'), 1)
+
+    @patch.dict(os.environ, {'OPENAI_API_KEY': 'test-key'})
+    @patch('modules.conversation_simulator.OpenAI')
+    def test_llm_clients_share_http_pool(self, mock_openai_cls):
+        """Every LLM client is built on the same process-wide HTTP client."""
+        mock_openai_cls.return_value = MagicMock()
+        ConversationSimulator()
+        ConversationSimulator()
+        first, second = (call.kwargs.get('http_client') for call in mock_openai_cls.call_args_list)
+        self.assertIsNotNone(first)
+        self.assertIs(first, second)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -10,6 +10,7 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from modules.feedback_generator import FeedbackGenerator
+from modules.nlp_scorer import NLPScorer, Scores
 
 
 class TestFeedbackGenerator(unittest.TestCase):
@@ -19,11 +20,7 @@ class TestFeedbackGenerator(unittest.TestCase):
     def test_generate_feedback(self):
         """Test basic feedback generation"""
         message = "I understand your concerns about vaccine safety."
-        scores = {
-            'empathy': 0.75,
-            'accuracy': 0.65,
-            'clarity': 0.70
-        }
+        scores = Scores(empathy=0.75, accuracy=0.65, clarity=0.70)
         
         feedback = self.generator.generate_feedback(message, scores)
         
@@ -37,11 +34,7 @@ class TestFeedbackGenerator(unittest.TestCase):
     def test_high_score_feedback(self):
         """Test feedback for high scores"""
         message = "I understand your concerns. The vaccine has been tested extensively."
-        scores = {
-            'empathy': 0.85,
-            'accuracy': 0.80,
-            'clarity': 0.82
-        }
+        scores = Scores(empathy=0.85, accuracy=0.80, clarity=0.82)
         
         feedback = self.generator.generate_feedback(message, scores)
         
@@ -50,15 +43,79 @@ class TestFeedbackGenerator(unittest.TestCase):
     def test_low_score_suggestions(self):
         """Test that low scores generate suggestions"""
         message = "Get vaccinated."
-        scores = {
-            'empathy': 0.3,
-            'accuracy': 0.4,
-            'clarity': 0.35
-        }
+        scores = Scores(empathy=0.3, accuracy=0.4, clarity=0.35)
         
         feedback = self.generator.generate_feedback(message, scores)
         
         self.assertGreater(len(feedback['suggestions']), 0)
+    
+    def test_level_boundaries(self):
+        """Test that each level starts exactly at its threshold"""
+        levels = [self.generator._get_level(score) for score in (0.49, 0.5, 0.65, 0.79, 0.8)]
+        
+        self.assertEqual(levels, ["Needs Improvement", "Fair", "Good", "Good", "Excellent"])
+    
+    def test_low_clarity_feedback_depends_on_length(self):
+        """Test that low clarity feedback distinguishes short and long messages"""
+        short = self.generator._get_clarity_feedback(0.3, "Get vaccinated.")
+        long = self.generator._get_clarity_feedback(0.3, "word " * 20)
+        
+        self.assertIn("too short", short['message'])
+        self.assertIn("unclear", long['message'])
+    
+    def test_strengths_use_scorer_acknowledgment(self):
+        """Test that the scorer's perspective flag is used instead of rescanning"""
+        scores = Scores(empathy=0.5, accuracy=0.5, clarity=0.5, acknowledges_perspective=True)
+        
+        feedback = self.generator.generate_feedback("Okay.", scores)
+        
+        self.assertIn("Acknowledges patient perspective", feedback['strengths'])
+    
+    def test_strengths_detect_acknowledgment_without_details(self):
+        """Test that the message is scanned when the scores do not say"""
+        scores = Scores(empathy=0.5, accuracy=0.5, clarity=0.5)
+        
+        feedback = self.generator.generate_feedback("I hear you.", scores)
+        
+        self.assertIn("Acknowledges patient perspective", feedback['strengths'])
+    
+    def test_strengths_fallback_matches_scorer(self):
+        """Test that the message scan agrees with the scorer's perspective flag"""
+        message = "There is a misunderstanding here."
+        scored = NLPScorer().score_message(message)
+        
+        scanned = self.generator.generate_feedback(message, Scores(empathy=0.5, accuracy=0.5, clarity=0.5))
+        flagged = self.generator.generate_feedback(message, scored)
+        
+        self.assertFalse(scored.acknowledges_perspective)
+        self.assertNotIn("Acknowledges patient perspective", scanned['strengths'])
+        self.assertNotIn("Acknowledges patient perspective", flagged['strengths'])
+    
+    def test_perspective_phrases_match_whole_words(self):
+        """Test that only whole perspective words earn the strength"""
+        scorer = NLPScorer()
+        
+        def acknowledged(message):
+            feedback = self.generator.generate_feedback(message, scorer.score_message(message))
+            return "Acknowledges patient perspective" in feedback['strengths']
+        
+        for message in ("I understand your worry.", "I appreciate you asking.", "I hear you."):
+            self.assertTrue(acknowledged(message), message)
+        for message in ("I appreciated the question.", "Understanding the data takes time.",
+                        "I heard it was rushed."):
+            self.assertFalse(acknowledged(message), message)
+    
+    def test_repeated_feedback_is_cached(self):
+        """Test that identical calls are served from the cache as independent copies"""
+        message = "Get vaccinated."
+        scores = Scores(empathy=0.3, accuracy=0.4, clarity=0.35)
+        
+        first = self.generator.generate_feedback(message, scores)
+        first['suggestions'].clear()
+        second = self.generator.generate_feedback(message, scores)
+        
+        self.assertEqual(self.generator._feedback_cached.cache_info().hits, 1)
+        self.assertGreater(len(second['suggestions']), 0)
 
 
 if __name__ == '__main__':
@@ -5,11 +5,12 @@ Tests for the NLP Scorer module
 import unittest
 import sys
 import os
+from unittest.mock import patch
 
 # Add parent directory to path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from modules.nlp_scorer import NLPScorer
+from modules.nlp_scorer import NLPScorer, _count_keywords, _empathy_from, _accuracy_from
 
 
 class TestNLPScorer(unittest.TestCase):
@@ -21,33 +22,152 @@ class TestNLPScorer(unittest.TestCase):
         message = "I understand your concerns about vaccine safety."
         scores = self.scorer.score_message(message)
         
-        self.assertIn('empathy', scores)
-        self.assertIn('accuracy', scores)
-        self.assertIn('clarity', scores)
-        self.assertGreaterEqual(scores['empathy'], 0)
-        self.assertLessEqual(scores['empathy'], 1)
+        self.assertIn('empathy', scores.as_dict())
+        self.assertIn('accuracy', scores.as_dict())
+        self.assertIn('clarity', scores.as_dict())
+        self.assertGreaterEqual(scores.empathy, 0)
+        self.assertLessEqual(scores.empathy, 1)
     
     def test_empathy_scoring(self):
         """Test empathy scoring with empathetic message"""
         empathetic_msg = "I completely understand your worry. It's natural to have concerns about side effects."
         scores = self.scorer.score_message(empathetic_msg)
         
-        self.assertGreater(scores['empathy'], 0.5)
+        self.assertGreater(scores.empathy, 0.5)
     
     def test_accuracy_scoring(self):
         """Test accuracy scoring with factual information"""
         accurate_msg = "Clinical trials with over 30,000 participants showed the vaccine is safe and effective."
         scores = self.scorer.score_message(accurate_msg)
         
-        self.assertGreater(scores['accuracy'], 0.5)
+        self.assertGreater(scores.accuracy, 0.5)
+    
+    def test_exclamations_count_as_sentences(self):
+        """Test that '!' and '?' end sentences for the clarity score"""
+        scores = self.scorer.score_message("Yes! No! Maybe! Okay! Fine! Sure! Great!")
+        
+        # Short (-0.2), seven sentences (-0.1), non-blank (+0.1)
+        self.assertEqual(scores.clarity, 0.3)
+    
+    def test_keyword_counts_per_category(self):
+        """Test that one scan counts distinct keywords in every category"""
+        counts = _count_keywords(
+            "you're safe, it's rare and safe. just ask about mrna or an antigen."
+        )
+        
+        self.assertEqual(counts['acknowledgment'], 1)
+        self.assertEqual(counts['accuracy'], 2)
+        self.assertEqual(counts['dismissive'], 1)
+        self.assertEqual(counts['jargon'], 2)
+        self.assertEqual(counts['misinformation'], 0)
+    
+    def test_import_does_not_load_nltk(self):
+        """Test that NLTK is only loaded once a scorer needs it"""
+        import subprocess
+        code = "import sys, modules.nlp_scorer; sys.exit('nltk' in sys.modules)"
+        backend = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+        
+        result = subprocess.run([sys.executable, '-c', code], cwd=backend)
+        
+        self.assertEqual(result.returncode, 0)
+    
+    def test_installed_vader_lexicon_is_not_downloaded_again(self):
+        """Test that an installed lexicon is found without calling nltk.download"""
+        import nltk
+        from modules.nlp_scorer import _ensure_vader_lexicon
+        
+        with patch.object(nltk.data, 'find') as find, patch.object(nltk, 'download') as download:
+            _ensure_vader_lexicon()
+        
+        find.assert_called_once_with('sentiment/vader_lexicon.zip')
+        download.assert_not_called()
+    
+    def test_scorers_share_sentiment_analyzer(self):
+        """Test that the VADER analyzer is loaded once, not per scorer"""
+        self.assertIs(NLPScorer().sia, self.scorer.sia)
+    
+    def test_repeated_message_is_cached(self):
+        """Test that rescoring the same text reuses the cached result"""
+        first = self.scorer.score_message("I understand your concerns about vaccine safety.")
+        second = self.scorer.score_message("  I understand your concerns about vaccine safety.  ")
+        
+        self.assertIs(first, second)
+        self.assertEqual(self.scorer._score_cached.cache_info().hits, 1)
+        
+        self.scorer.clear_cache()
+        self.assertEqual(self.scorer._score_cached.cache_info().currsize, 0)
+    
+    def test_sentiment_analyzed_once_per_message(self):
+        """Test that the fused scoring pass runs VADER only once"""
+        with patch.object(self.scorer.sia, 'polarity_scores',
+                          wraps=self.scorer.sia.polarity_scores) as polarity_scores:
+            self.scorer.score_message("I understand your concerns about vaccine safety.")
+        
+        self.assertEqual(polarity_scores.call_count, 1)
+    
+    def test_score_formulas_clamp_to_unit_range(self):
+        """Test that the scoring formulas stay within 0-1"""
+        self.assertEqual(_empathy_from(5, True, 0.9, False, True), 1.0)
+        self.assertEqual(_accuracy_from(0, True, False, False), 0.2)
+        self.assertGreaterEqual(_empathy_from(0, False, -0.9, True, False), 0.0)
+    
+    def test_single_word_keywords_match_whole_words(self):
+        """Test that single-word keywords do not match inside longer words"""
+        counts = _count_keywords("there is a misunderstanding that it is unsafe")
+        
+        self.assertEqual(counts['empathy'], 0)
+        self.assertEqual(counts['accuracy'], 0)
+        
+        counts = _count_keywords("i understand. it is safe/effective, and rare")
+        
+        self.assertEqual(counts['empathy'], 1)
+        self.assertEqual(counts['accuracy'], 3)
+    
+    def test_phrases_match_whole_words(self):
+        """Test that multi-word and punctuated keywords respect word boundaries"""
+        counts = _count_keywords("hi hearing that, i heard you mustn't wait")
+        
+        self.assertEqual(counts['perspective'], 0)
+        self.assertEqual(counts['dismissive'], 0)
+        
+        counts = _count_keywords("i hear you're worried; it's peer-reviewed.")
+        
+        self.assertEqual(counts['perspective'], 1)
+        self.assertEqual(counts['acknowledgment'], 1)
+        self.assertEqual(counts['accuracy'], 1)
+    
+    def test_score_messages_batch(self):
+        """Test that batch scoring matches scoring messages one at a time"""
+        messages = [
+            "I understand your concerns about vaccine safety.",
+            "",
+            "I understand your concerns about vaccine safety.",
+            "Clinical trials showed the vaccine is safe and effective."
+        ]
+        
+        batch = self.scorer.score_messages(messages)
+        
+        self.assertEqual(batch, [NLPScorer().score_message(m) for m in messages])
+        self.assertEqual(self.scorer._score_cached.cache_info().misses, 2)
+    
+    def test_scores_as_dict(self):
+        """Test that scores serialize to the API's JSON shape"""
+        scores = self.scorer.score_message("Is the vaccine safe?").as_dict()
+        
+        self.assertEqual(set(scores), {'empathy', 'accuracy', 'clarity', 'details'})
+        self.assertEqual(scores['details']['word_count'], 4)
+        self.assertTrue(scores['details']['has_question'])
+        self.assertEqual(set(scores['details']['sentiment']),
+                         {'compound', 'positive', 'negative', 'neutral'})
+        self.assertEqual(self.scorer.score_message("").as_dict()['details'], {})
     
     def test_empty_message(self):
         """Test handling of empty messages"""
         scores = self.scorer.score_message("")
         
-        self.assertEqual(scores['empathy'], 0.0)
-        self.assertEqual(scores['accuracy'], 0.0)
-        self.assertEqual(scores['clarity'], 0.0)
+        self.assertEqual(scores.empathy, 0.0)
+        self.assertEqual(scores.accuracy, 0.0)
+        self.assertEqual(scores.clarity, 0.0)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,295 @@
+"""
+Tests for the Session Store module
+"""
+
+import unittest
+import sys
+import os
+import time
+import threading
+from collections import OrderedDict
+from unittest.mock import MagicMock, patch
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from modules.session_store import InMemorySessionStore, RedisSessionStore, create_session_store
+
+
+class TestInMemorySessionStore(unittest.TestCase):
+    def setUp(self):
+        self.store = InMemorySessionStore()
+        self.store.create('abc', {'persona_key': 'default', 'turn_count': 0})
+
+    def test_create_and_get(self):
+        """Test that created sessions can be read back"""
+        self.assertIn('abc', self.store)
+        self.assertEqual(self.store.get('abc')['persona_key'], 'default')
+        self.assertIsNone(self.store.get('missing'))
+
+    def test_update(self):
+        """Test that updates overwrite state fields"""
+        self.store.update('abc', turn_count=3)
+        self.assertEqual(self.store.get('abc')['turn_count'], 3)
+
+    def test_recent_history(self):
+        """Test that only the requested number of recent turns is returned"""
+        for i in range(5):
+            self.store.append_history('abc', {'speaker': 'student', 'message': str(i)})
+
+        recent = self.store.recent_history('abc', 2)
+
+        self.assertEqual([turn['message'] for turn in recent], ['3', '4'])
+        self.assertEqual(len(self.store.history('abc')), 5)
+
+    def test_append_several_entries(self):
+        """Test that several turns can be appended in one call"""
+        self.store.append_history('abc', {'message': 'a'}, {'message': 'b'})
+
+        self.assertEqual([turn['message'] for turn in self.store.history('abc')], ['a', 'b'])
+        self.assertEqual(len(self.store.recent_history('abc', 8)), 2)
+
+    def test_recent_history_bounded_by_context_size(self):
+        """Test that the recent-turn buffer never grows past context_size"""
+        store = InMemorySessionStore(context_size=3)
+        store.create('abc', {})
+        for i in range(10):
+            store.append_history('abc', {'speaker': 'student', 'message': str(i)})
+
+        recent = store.recent_history('abc', 8)
+
+        self.assertEqual([turn['message'] for turn in recent], ['7', '8', '9'])
+        self.assertEqual(len(store.history('abc')), 10)
+
+    def test_response_cache_evicts_least_recently_used(self):
+        """Test that the response cache is bounded and keeps recently used entries"""
+        self.store._MAX_CACHED_RESPONSES = 2
+        self.store.cache_response('a', 'first')
+        self.store.cache_response('b', 'second')
+        self.store.get_cached_response('a')
+        self.store.cache_response('c', 'third')
+
+        self.assertEqual(self.store.get_cached_response('a'), 'first')
+        self.assertIsNone(self.store.get_cached_response('b'))
+        self.assertEqual(self.store.get_cached_response('c'), 'third')
+
+    def test_response_cache_eviction_waits_for_lookup(self):
+        """Test that another thread cannot evict an entry in the middle of a lookup"""
+        in_lookup = threading.Event()
+        evicted = threading.Event()
+
+        class PausingCache(OrderedDict):
+            def get(self, key, default=None):
+                value = super().get(key, default)
+                in_lookup.set()
+                evicted.wait(0.2)
+                return value
+
+        self.store._MAX_CACHED_RESPONSES = 1
+        self.store._response_cache = PausingCache(a='first')
+        results = []
+        lookup = threading.Thread(target=lambda: results.append(self.store.get_cached_response('a')))
+        lookup.start()
+        in_lookup.wait(1)
+
+        evict = threading.Thread(target=lambda: (self.store.cache_response('b', 'second'), evicted.set()))
+        evict.start()
+        lookup.join()
+        evict.join()
+
+        self.assertEqual(results, ['first'])
+        self.assertIsNone(self.store.get_cached_response('a'))
+
+    def test_tasks_expire(self):
+        """Test that task status is readable until its TTL runs out"""
+        store = InMemorySessionStore(task_ttl_seconds=60)
+        store.set_task('t1', {'status': 'pending'})
+        self.assertEqual(store.get_task('t1'), {'status': 'pending'})
+
+        with patch('modules.session_store.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(store.get_task('t1'))
+            store.set_task('t2', {'status': 'pending'})
+
+        self.assertNotIn('t1', store._tasks)
+
+    def test_tasks_are_bounded(self):
+        """Test that the oldest tasks are dropped once the limit is reached"""
+        self.store._MAX_TASKS = 2
+        for task_id in ('t1', 't2', 't3'):
+            self.store.set_task(task_id, {'status': 'pending'})
+
+        self.assertIsNone(self.store.get_task('t1'))
+        self.assertEqual(self.store.get_task('t3'), {'status': 'pending'})
+
+        self.store.delete_task('t3')
+        self.assertIsNone(self.store.get_task('t3'))
+
+    def test_one_running_task_per_session(self):
+        """Test that a session runs one message task at a time until it finishes or expires"""
+        store = InMemorySessionStore(task_ttl_seconds=60)
+        self.assertTrue(store.start_session_task('abc', 't1'))
+        self.assertFalse(store.start_session_task('abc', 't2'))
+        self.assertTrue(store.start_session_task('xyz', 't3'))
+
+        store.finish_session_task('abc')
+        self.assertTrue(store.start_session_task('abc', 't4'))
+
+        with patch('modules.session_store.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertTrue(store.start_session_task('abc', 't5'))
+
+    def test_delete(self):
+        """Test that deleted sessions are gone"""
+        self.store.delete('abc')
+        self.assertNotIn('abc', self.store)
+
+
+class TestRedisSessionStore(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.store = RedisSessionStore(self.client, ttl_seconds=3600,
+                                       cache_ttl_seconds=86400, task_ttl_seconds=600)
+
+    def test_create_and_get_round_trip(self):
+        """Test that state fields are stored as JSON and decoded with str keys"""
+        pipe = self.client.pipeline.return_value
+        self.store.create('abc', {'persona_key': 'default', 'turn_count': 0})
+
+        pipe.hset.assert_called_once_with(
+            'session:abc', mapping={'persona_key': '"default"', 'turn_count': '0'}
+        )
+        pipe.execute.assert_called_once_with()
+
+        self.client.hgetall.return_value = {b'persona_key': b'"default"', b'turn_count': b'0'}
+        self.assertEqual(self.store.get('abc'), {'persona_key': 'default', 'turn_count': 0})
+        self.client.hgetall.assert_called_with('session:abc')
+
+        self.client.hgetall.return_value = {}
+        self.assertIsNone(self.store.get('missing'))
+
+    def test_update(self):
+        """Test that updates write only the given fields as JSON"""
+        pipe = self.client.pipeline.return_value
+        self.store.update('abc', turn_count=3, score_totals={'empathy': 1.5})
+
+        pipe.hset.assert_called_once_with(
+            'session:abc', mapping={'turn_count': '3', 'score_totals': '{"empathy": 1.5}'}
+        )
+
+    def test_writes_refresh_ttl_on_both_keys(self):
+        """Test that a turn is one RPUSH that refreshes the expiry of both keys"""
+        pipe = self.client.pipeline.return_value
+        self.store.append_history('abc', {'speaker': 'student', 'message': 'Hi'},
+                                  {'speaker': 'patient', 'message': 'Hello'})
+
+        pipe.rpush.assert_called_once_with(
+            'session:abc:history',
+            '{"speaker": "student", "message": "Hi"}',
+            '{"speaker": "patient", "message": "Hello"}'
+        )
+        pipe.execute.assert_called_once_with()
+        pipe.expire.assert_any_call('session:abc', 3600)
+        pipe.expire.assert_any_call('session:abc:history', 3600)
+        self.assertEqual(pipe.expire.call_count, 2)
+
+    def test_recent_history(self):
+        """Test that recent history reads only the tail of the list"""
+        self.client.lrange.return_value = [b'{"message": "3"}', b'{"message": "4"}']
+
+        recent = self.store.recent_history('abc', 2)
+
+        self.client.lrange.assert_called_once_with('session:abc:history', -2, -1)
+        self.assertEqual([turn['message'] for turn in recent], ['3', '4'])
+
+    def test_history(self):
+        """Test that the full history is read and decoded"""
+        self.client.lrange.return_value = [b'{"message": "1"}']
+
+        self.assertEqual(self.store.history('abc'), [{'message': '1'}])
+        self.client.lrange.assert_called_once_with('session:abc:history', 0, -1)
+
+    def test_contains(self):
+        """Test that membership checks the state key"""
+        self.client.exists.return_value = 1
+        self.assertIn('abc', self.store)
+        self.client.exists.assert_called_with('session:abc')
+
+        self.client.exists.return_value = 0
+        self.assertNotIn('abc', self.store)
+
+    def test_delete_removes_both_keys(self):
+        """Test that deleting a session removes its state and history"""
+        self.store.delete('abc')
+
+        self.client.delete.assert_called_once_with('session:abc', 'session:abc:history')
+
+    def test_response_cache(self):
+        """Test that LLM responses are cached with the cache TTL and decoded"""
+        self.store.cache_response('key', 'Hello there.')
+        self.client.setex.assert_called_once_with('llm:key', 86400, 'Hello there.')
+
+        self.client.get.return_value = b'Hello there.'
+        self.assertEqual(self.store.get_cached_response('key'), 'Hello there.')
+        self.client.get.assert_called_with('llm:key')
+
+        self.client.get.return_value = None
+        self.assertIsNone(self.store.get_cached_response('key'))
+
+    def test_set_task_expires(self):
+        """Test that task status is stored as JSON with the task TTL"""
+        self.store.set_task('t1', {'status': 'pending'})
+
+        self.client.setex.assert_called_once_with('task:t1', 600, '{"status": "pending"}')
+
+    def test_get_task(self):
+        """Test that task status is decoded, and missing tasks return None"""
+        self.client.get.return_value = b'{"status": "done", "result": {"patient_message": "Okay."}}'
+        self.assertEqual(self.store.get_task('t1')['result']['patient_message'], 'Okay.')
+        self.client.get.assert_called_with('task:t1')
+
+        self.client.get.return_value = None
+        self.assertIsNone(self.store.get_task('t1'))
+
+    def test_delete_task(self):
+        """Test that deleting a task removes its key"""
+        self.store.delete_task('t1')
+
+        self.client.delete.assert_called_once_with('task:t1')
+
+
+    def test_session_task_uses_set_nx(self):
+        """Test that claiming a session for a task is an atomic SET NX with the task TTL"""
+        self.client.set.return_value = True
+        self.assertTrue(self.store.start_session_task('abc', 't1'))
+        self.client.set.assert_called_once_with('session-task:abc', 't1', nx=True, ex=600)
+
+        self.client.set.return_value = None
+        self.assertFalse(self.store.start_session_task('abc', 't2'))
+
+        self.store.finish_session_task('abc')
+        self.client.delete.assert_called_once_with('session-task:abc')
+
+
+class TestCreateSessionStore(unittest.TestCase):
+    def test_in_memory_without_redis_url(self):
+        """Without REDIS_URL sessions are kept in memory"""
+        env = {k: v for k, v in os.environ.items() if k != 'REDIS_URL'}
+        with patch.dict(os.environ, env, clear=True):
+            store = create_session_store()
+        self.assertIsInstance(store, InMemorySessionStore)
+
+    def test_redis_with_redis_url(self):
+        """With REDIS_URL sessions are kept in Redis with the configured TTLs"""
+        env = {'REDIS_URL': 'redis://localhost:6379/0', 'SESSION_TTL_SECONDS': '120',
+               'LLM_CACHE_TTL_SECONDS': '60', 'TASK_TTL_SECONDS': '30'}
+        with patch.dict(os.environ, env), \
+                patch('modules.session_store.redis.Redis.from_url') as from_url:
+            store = create_session_store()
+
+        from_url.assert_called_once_with('redis://localhost:6379/0')
+        self.assertIsInstance(store, RedisSessionStore)
+        self.assertIs(store._redis, from_url.return_value)
+        self.assertEqual((store._ttl, store._cache_ttl, store._task_ttl), (120, 60, 30))
+
+
+if __name__ == '__main__':
+    unittest.main()